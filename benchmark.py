@@ -0,0 +1,761 @@
+import argparse
+import functools
+import hashlib
+import json
+import io
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import loader
+from loader import (GID_FORNECEDOR, SPREADSHEET_ID, ConnectionPool, adjust_headers, apply_schema, clean_supplier_frame, fetch_suppliers, invalidate_snapshot,
+                    load_sources, load_suppliers, read_supplier_csv)
+import margins
+import parallel
+import profiling
+import store
+from inputs import apply_overlay, new_overlay, record_edits
+from filters import build_filter_index
+from charts import BAR_MODES, build_holding_curves_figure, build_margin_bar_figure
+from margins import (COST_COLUMNS, combine_margins, compute_margins, holding_cost_matrix, parse_unidade_embalagem,
+                     scenario_surfaces, update_margin_patch)
+from tables import paginate
+from synthetic import make_edited_frame, make_fornecedor2_csv, make_sheet_csv, serve, sheet_export_path
+
+# Tamanhos padrão (linhas) dos benchmarks, quando --sizes não é informado
+SIZES = [1_000, 100_000, 1_000_000]
+
+# Script do dashboard, executado pelos benchmarks com o AppTest do Streamlit
+DASHBOARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py')
+
+# Referência de tempos e resultados da suíte por etapa (python benchmark.py stages --save-baseline)
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+# Implementação anterior: baixa a planilha para contar colunas e baixa de novo no pandas
+def legacy_fetch_suppliers(url):
+    raw_data = urllib.request.urlopen(url).read().decode('utf-8')
+    lines = raw_data.split('\n')
+    num_columns = len(lines[0].split(',')) if lines else 0
+    df = pd.read_csv(url, names=adjust_headers(num_columns), skiprows=1, encoding='utf-8', keep_default_na=False)
+    return clean_supplier_frame(df)
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_ingestion(sizes=SIZES):
+    payloads = {f'/sheet{n}.csv': make_sheet_csv(n) for n in sizes}
+    with serve(payloads) as base_url:
+        for n in sizes:
+            url = f'{base_url}/sheet{n}.csv'
+            legacy_s, legacy_df = timed(legacy_fetch_suppliers, url)
+            new_s, new_df = timed(fetch_suppliers, url)
+            pd.testing.assert_frame_equal(legacy_df, new_df)
+            print(f"ingestão {n:>9} linhas: anterior {legacy_s * 1000:9.1f} ms | atual {new_s * 1000:9.1f} ms | {legacy_s / new_s:4.2f}x")
+
+
+# Tempo do motor de margem vetorizado contra a versão com apply/iterrows (a implementação
+# anterior e a paridade ficam em tests/test_margins.py)
+def bench_margins(sizes=SIZES):
+    from tests.test_margins import legacy_compute_margins
+
+    for n in sizes:
+        df = make_edited_frame(n)
+        legacy_s, _ = timed(legacy_compute_margins, df, repeat=1)
+        new_s, _ = timed(compute_margins, df)
+        print(f"margens  {n:>9} linhas: anterior {legacy_s * 1000:9.1f} ms | atual {new_s * 1000:9.1f} ms | {legacy_s / new_s:6.1f}x")
+
+
+# Parser de embalagens numa coluna grande com poucos textos distintos (~500)
+def bench_parser(sizes=SIZES):
+    from tests.test_margins import legacy_parse_unidade_embalagem
+
+    distinct = np.array(
+        [f'{u},00 unidades de {w} kg' for u in range(1, 101) for w in ('0,5', '1', '2,5')]
+        + [f'{u},00' for u in range(1, 101)]
+        + [f'{u},00 UNIDADES DE {w}kg' for u in range(1, 101) for w in ('0,25',)]
+    )
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        series = pd.Series(distinct[rng.integers(0, len(distinct), n)])
+        legacy_s, legacy = timed(lambda: pd.DataFrame(series.apply(legacy_parse_unidade_embalagem).tolist(), columns=['u', 'p']), repeat=1)
+        margins._parse_cache.clear()
+        cold_s, parsed = timed(parse_unidade_embalagem, series, repeat=1)
+        warm_s, _ = timed(parse_unidade_embalagem, series)
+        np.testing.assert_array_equal(legacy['u'].to_numpy(), parsed['Unidades por Embalagem'].to_numpy())
+        np.testing.assert_array_equal(legacy['p'].to_numpy(), parsed['Peso por Unidade (kg)'].to_numpy())
+        print(f"parser   {n:>9} linhas ({len(distinct)} distintos): anterior {legacy_s * 1000:9.1f} ms | "
+              f"atual {cold_s * 1000:7.1f} ms (cache frio) {warm_s * 1000:7.1f} ms (cache quente)")
+
+
+# Implementação anterior das curvas de tempo de estoque: laço por fornecedor e por mês
+def legacy_holding_curves(edited_df, tempos_estoque_meses, taxa_juros_anual):
+    taxa_juros_mensal = taxa_juros_anual / 12.0
+    curvas = []
+    for _, row in edited_df.iterrows():
+        margem_liquida_inicial = row['Margem Líquida Inicial (%)']
+        if margem_liquida_inicial != 0.0:
+            curvas.append([max(0, margem_liquida_inicial - (taxa_juros_mensal * (mes - 1))) for mes in tempos_estoque_meses])
+        else:
+            curvas.append([None] * len(tempos_estoque_meses))
+    return curvas
+
+
+# Matriz fornecedores × meses em forma fechada contra os laços por fornecedor
+def bench_holding(sizes=SIZES):
+    tempos_estoque_meses = np.arange(1, 25)
+    for n in sizes:
+        derived, _ = compute_margins(make_edited_frame(n))
+        legacy_s, legacy = timed(legacy_holding_curves, derived, tempos_estoque_meses, 12.0, repeat=1)
+        new_s, matrix = timed(holding_cost_matrix, derived['Margem Líquida Inicial (%)'], tempos_estoque_meses, 12.0)
+        np.testing.assert_allclose(np.array(legacy, dtype=float), matrix, rtol=1e-12)
+        print(f"estoque  {n:>9} fornecedores: anterior {legacy_s * 1000:9.1f} ms | atual {new_s * 1000:9.1f} ms | {legacy_s / new_s:6.1f}x")
+
+
+# Custo de serialização por execução: cada tabela inteira contra uma página de 100 linhas
+# ordenada no servidor (conversão para Arrow feita pelo Streamlit), e o tempo de um rerun
+# completo do dashboard com e sem o modo paginado
+def bench_serialization(sizes=(1_000, 50_000, 500_000), page_size=100):
+    from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
+
+    for n in sizes:
+        derived, margem_data = compute_margins(make_edited_frame(n))
+        margens = holding_cost_matrix(derived['Margem Líquida Inicial (%)'], np.arange(1, 25), 12.0)
+        tables = {
+            'editor': apply_overlay(clean_supplier_frame(read_supplier_csv(io.BytesIO(make_sheet_csv(n)))), new_overlay(None)),
+            'margem': margem_data,
+            'estoque': margins.build_holding_table(derived, margens[:, 11], 12.0),
+        }
+        for name, table in tables.items():
+            full_s, full = timed(convert_pandas_df_to_arrow_bytes, table)
+            page_s, page = timed(lambda: convert_pandas_df_to_arrow_bytes(paginate(table, 2, page_size, table.columns[-2], False)))
+            print(f"serial.  {n:>9} linhas ({name:<7}): inteira {full_s * 1000:8.1f} ms {len(full) / 2**20:7.2f} MiB | "
+                  f"página {page_s * 1000:6.1f} ms {len(page) / 2**10:7.1f} KiB")
+
+        # Cada dashboard roda num processo separado: sem paginação, planilhas grandes podem
+        # esgotar a memória, e isso vira um resultado em vez de derrubar o benchmark
+        payloads = {f'/{SPREADSHEET_ID}/{GID_FORNECEDOR}': make_sheet_csv(n)}
+        with serve(payloads) as base_url, tempfile.TemporaryDirectory() as snapshot_dir:
+            reruns = []
+            for paginar in (False, True):
+                context = multiprocessing.get_context('spawn')
+                queue = context.Queue()
+                process = context.Process(target=dashboard_rerun, args=(base_url + '/{spreadsheet_id}/{gid}', snapshot_dir, paginar, queue))
+                process.start()
+                process.join()
+                reruns.append(f"{queue.get() * 1000:8.1f} ms" if process.exitcode == 0 else f"falhou (código {process.exitcode})")
+        print(f"rerun    {n:>9} linhas: tabelas inteiras {reruns[0]} | paginado {reruns[1]}")
+
+
+# Tempo de um rerun do dashboard (mudança no tempo de estoque) com ou sem o modo paginado
+def dashboard_rerun(url_template, snapshot_dir, paginar, queue):
+    from streamlit.testing.v1 import AppTest
+
+    loader.SourceRefresher = functools.partial(loader.SourceRefresher, snapshot_dir=snapshot_dir, url_template=url_template)
+    store.InputStore = functools.partial(store.InputStore, os.path.join(snapshot_dir, 'entradas.sqlite'))
+    app = AppTest.from_file(DASHBOARD_SCRIPT, default_timeout=600)
+    app.run()
+    next(toggle for toggle in app.toggle if toggle.label == "Paginar tabelas").set_value(paginar).run()
+    slider = next(slider for slider in app.slider if slider.label == "Tempo de Estoque (Meses)")
+    rerun_s, _ = timed(lambda: slider.set_value(int(slider.value) % 24 + 1).run())
+    assert not app.exception, app.exception
+    queue.put(rerun_s)
+
+
+# Módulos cuja importação a frio é medida pelo benchmark de inicialização
+STARTUP_MODULES = ['streamlit', 'numpy', 'pandas', 'pyarrow', 'plotly.graph_objects', 'loader', 'margins', 'store', 'columns', 'charts']
+
+# Primeira execução do dashboard num interpretador novo (como um contêiner recém-criado), com o
+# AppTest: marca quando a primeira mensagem e a primeira tabela saem para o navegador, depois
+# repete a execução (rerun) e executa de novo com as seções de gráficos abertas
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+from streamlit.testing.v1 import AppTest
+
+marks = {}
+enqueue = ForwardMsgQueue.enqueue
+
+def record(self, msg):
+    if msg.WhichOneof('type') == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+        now = time.perf_counter()
+        marks.setdefault('first', now)
+        if msg.delta.new_element.WhichOneof('type') == 'dataframe':
+            marks.setdefault('table', now)
+    return enqueue(self, msg)
+
+ForwardMsgQueue.enqueue = record
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+imported = time.perf_counter()
+app.run()
+finished = time.perf_counter()
+assert not app.exception, app.exception
+charts = 'charts' in sys.modules
+t = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - t
+for key in ('secao_barras', 'secao_curvas', 'secao_cenarios'):
+    app.session_state[key] = True
+t = time.perf_counter()
+app.run()
+sections = time.perf_counter() - t
+assert not app.exception, app.exception
+print(json.dumps({
+    'import': imported - start, 'first': marks['first'] - imported, 'table': marks['table'] - imported,
+    'run': finished - imported, 'rerun': rerun, 'sections': sections, 'charts': charts,
+}))
+"""
+
+
+# Segundos para importar um módulo num interpretador novo (com as dependências dele)
+def cold_import_s(module, repeat=3):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    directory = os.path.dirname(DASHBOARD_SCRIPT)
+    return min(float(subprocess.run([sys.executable, '-c', code], cwd=directory, capture_output=True, text=True, check=True).stdout) for _ in range(repeat))
+
+
+# Inicialização do dashboard: importação a frio de cada módulo e, para cada tamanho, um processo
+# novo por cenário: sem snapshot (contêiner novo, busca a planilha) e com o snapshot local de um
+# processo anterior. Mostra o tempo até a primeira mensagem (título), até a primeira tabela e da
+# execução inteira; o Plotly só deve ser carregado quando uma seção com gráfico é aberta
+def bench_startup(sizes=(1_000, 50_000)):
+    print("importação a frio: " + " | ".join(f"{module} {cold_import_s(module) * 1000:.0f}" for module in STARTUP_MODULES) + " (ms)")
+    for n in sizes:
+        with serve({sheet_export_path(): make_fornecedor2_csv(n)}) as base_url, tempfile.TemporaryDirectory() as cache_dir:
+            env = {
+                **os.environ, 'DASHBOARD_CACHE_DIR': cache_dir,
+                'DASHBOARD_SHEET_URL': base_url + sheet_export_path('{spreadsheet_id}', '{gid}'),
+            }
+            for label in ('sem snapshot', 'com snapshot'):
+                result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, DASHBOARD_SCRIPT], env=env, capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"início   {n:>9} linhas ({label}): falhou (código {result.returncode})\n{result.stderr[-2000:]}")
+                    continue
+                r = json.loads(result.stdout.strip().splitlines()[-1])
+                assert not r['charts'], "charts (Plotly) carregado sem nenhuma seção de gráfico aberta"
+                print(
+                    f"início   {n:>9} linhas ({label}): streamlit {r['import'] * 1000:5.0f} ms | primeira mensagem {r['first'] * 1000:5.0f} ms | "
+                    f"primeira tabela {r['table'] * 1000:6.0f} ms | execução {r['run'] * 1000:6.0f} ms | "
+                    f"rerun {r['rerun'] * 1000:5.0f} ms | com gráficos {r['sections'] * 1000:6.0f} ms"
+                )
+
+
+# Uma execução do pipeline do dashboard sobre a planilha servida em url_template, medida por
+# etapa com o profiling: busca, parse e limpeza (sem snapshot), decodificação do snapshot,
+# entradas, embalagens, margem, custo de estoque, cenários, tabelas e gráficos. Devolve a
+# execução medida e um hash dos resultados, para detectar mudanças nos números
+def pipeline_run(url_template, snapshot_dir):
+    margins._parse_cache.clear()
+    profiling.start_run('benchmark')
+    df, errors, _ = load_sources(snapshot_dir=snapshot_dir, url_template=url_template, pool=ConnectionPool())
+    assert not errors, errors
+    load_sources(snapshot_dir=snapshot_dir, url_template=url_template, pool=ConnectionPool())  # snapshot recém-gravado
+    with profiling.stage('inputs', rows=len(df)):
+        editor_df = apply_overlay(df, new_overlay(None))
+    with profiling.stage('packaging', rows=len(df)):
+        parse_unidade_embalagem(df['UNIDADE/EMBALAGEM'])
+    with profiling.stage('margin', rows=len(df)):
+        derived, margem_data = compute_margins(editor_df)
+    meses, taxas = np.arange(1, 25), np.linspace(0.0, 50.0, 101)
+    with profiling.stage('holding', rows=len(df)):
+        matriz = holding_cost_matrix(derived['Margem Líquida Inicial (%)'], meses, 12.0)
+    with profiling.stage('scenarios', rows=len(df)):
+        taxa_equilibrio, tempo_maximo = scenario_surfaces(derived['Margem Líquida Inicial (%)'], meses, taxas)
+    with profiling.stage('table', rows=len(df)):
+        holding_table = margins.build_holding_table(derived, matriz[:, 11], 12.0)
+    with profiling.stage('figure', rows=len(df)):
+        build_margin_bar_figure(derived, 'Detalhado')
+        build_holding_curves_figure(matriz, holding_table['Fornecedor (Marca)'].to_numpy(), meses, 12.0)
+    run = profiling.finish_run()
+
+    digest = hashlib.sha256()
+    for frame in (margem_data, holding_table):
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    for array in (matriz, taxa_equilibrio, tempo_maximo):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return run, digest.hexdigest()[:16]
+
+
+# Suíte por etapa: planilhas FORNECEDOR2 sintéticas servidas pelo servidor local, melhor tempo
+# de cada etapa em `repeat` execuções. Devolve os tempos e os hashes para a comparação com o
+# arquivo de referência (--baseline)
+def bench_stages(sizes=(1_000, 50_000, 500_000), repeat=5):
+    timings, checksums = {}, {}
+    for n in sizes:
+        payloads = {sheet_export_path(): make_fornecedor2_csv(n)}
+        best = {}
+        with serve(payloads) as base_url:
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as snapshot_dir:
+                    run, checksum = pipeline_run(base_url + sheet_export_path('{spreadsheet_id}', '{gid}'), snapshot_dir)
+                for name, _, ms, _, _ in profiling.summarize(run):
+                    best[name] = min(best.get(name, float('inf')), ms)
+                best['total'] = min(best.get('total', float('inf')), run['total_ms'])
+        checksums[str(n)] = checksum
+        for name, ms in best.items():
+            timings[f'{name}@{n}'] = ms
+        print(f"etapas   {n:>9} linhas: " + " | ".join(f"{name} {ms:.1f}" for name, ms in best.items()) + f" (ms) [{checksum}]")
+    return {'timings': timings, 'checksums': checksums}
+
+
+# Comparar os resultados com a referência: etapas mais lentas que (1 + threshold) vezes a
+# referência (e ao menos min_ms mais lentas, para ignorar ruído) e hashes de resultado diferentes
+def compare_baseline(results, baseline, threshold, min_ms=5.0):
+    problems = []
+    for key, ms in results['timings'].items():
+        reference = baseline['timings'].get(key)
+        if reference is not None and ms > reference * (1 + threshold) and ms - reference > min_ms:
+            problems.append(f"REGRESSÃO {key}: {reference:.1f} ms -> {ms:.1f} ms ({ms / reference - 1:+.0%})")
+    for size, checksum in results['checksums'].items():
+        reference = baseline['checksums'].get(size)
+        if reference is not None and reference != checksum:
+            problems.append(f"RESULTADO ALTERADO com {size} linhas: {reference} -> {checksum}")
+    return problems
+
+
+# Ambiente em que os tempos foram medidos, gravado junto da referência
+def environment():
+    return {
+        'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__, 'pyarrow': pa.__version__,
+        'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+    }
+
+
+# Atualização em segundo plano contra o servidor local com respostas lentas e com falhas. Mostra a
+# maior espera de uma leitura durante cada atualização (o comportamento é verificado em
+# tests/test_refresher.py)
+def bench_refresh(sizes=(1_000, 100_000), slow=2.0, readers=8):
+    for n in sizes:
+        path = sheet_export_path()
+        payloads, delays = {path: make_fornecedor2_csv(n)}, {}
+        with serve(payloads, delays=delays) as base_url, tempfile.TemporaryDirectory() as snapshot_dir:
+            refresher = loader.SourceRefresher(
+                interval=3600, snapshot_dir=snapshot_dir, url_template=base_url + sheet_export_path('{spreadsheet_id}', '{gid}'),
+                pool=ConnectionPool(), prepare=build_filter_index,
+            )
+            first = refresher.current(timeout=60)
+
+            # Mede a maior espera de `readers` threads lendo o conjunto até a condição valer
+            def max_wait_until(condition, timeout=120):
+                waits, stop = [], threading.Event()
+
+                def read():
+                    worst = 0.0
+                    while not stop.is_set():
+                        start = time.perf_counter()
+                        refresher.current()
+                        worst = max(worst, time.perf_counter() - start)
+                        time.sleep(0.001)
+                    waits.append(worst)
+
+                threads = [threading.Thread(target=read) for _ in range(readers)]
+                for thread in threads:
+                    thread.start()
+                deadline = time.time() + timeout
+                while not condition() and time.time() < deadline:
+                    time.sleep(0.01)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                return max(waits) * 1000
+
+            # Planilha nova, servida devagar: leituras seguem com a versão anterior até a troca
+            payloads[path], delays[path] = make_fornecedor2_csv(n, seed=1), slow
+            refresher.trigger()
+            slow_ms = max_wait_until(lambda: refresher.dataset['version'] != first['version'])
+            changed = refresher.current()
+
+            # Servidor com erro: a versão servida não muda
+            payloads[path] = 500
+            refresher.trigger()
+            fail_ms = max_wait_until(lambda: refresher.status['errors'] and not refresher.status['refreshing'])
+
+            # Servidor de volta com o mesmo conteúdo: só a hora da confirmação avança
+            payloads[path] = make_fornecedor2_csv(n, seed=1)
+            del delays[path]
+            refresher.trigger()
+            max_wait_until(lambda: not refresher.status['errors'] and refresher.dataset['checked_at'] > changed['checked_at'])
+            refresher.stop(timeout=10)
+        print(f"refresh  {n:>9} linhas: maior espera de leitura durante atualização lenta {slow_ms:6.1f} ms | com falha {fail_ms:6.1f} ms")
+
+
+# Entradas gravadas com o InputStore e juntadas de volta a planilhas com linhas acrescentadas,
+# removidas e reordenadas. Mede a junção na carga (o comportamento é verificado em
+# tests/test_store.py)
+def bench_inputs(sizes=SIZES, n_edits=500):
+    for n in sizes:
+        rng = np.random.default_rng(n)
+        sheet = clean_supplier_frame(read_supplier_csv(io.BytesIO(make_fornecedor2_csv(n)))).assign(FONTE='FORNECEDOR2')
+        # Chaves únicas, para que cada linha tenha uma identidade independente da posição
+        sheet = apply_schema(sheet.drop_duplicates(store.KEY_COLUMNS, ignore_index=True))
+        with tempfile.TemporaryDirectory() as tmp:
+            armazem = store.InputStore(os.path.join(tmp, 'entradas.sqlite'), debounce=60)
+            chaves = store.row_keys(sheet)
+            editadas = rng.choice(len(sheet), min(n_edits, len(sheet)), replace=False)
+            overlay = new_overlay('v1')
+            for i, pos in enumerate(editadas):  # Uma edição por rerun, como no editor
+                edits = {int(pos): {'PREÇO DE VENDA': float(i + 1), 'Logística (R$)': None if i % 7 == 0 else float(i)}}
+                armazem.put(chaves, record_edits(overlay, sheet.index, edits))
+            armazem.flush()
+
+            keep = np.ones(len(sheet), dtype=bool)
+            keep[rng.choice(len(sheet), len(sheet) // 10, replace=False)] = False
+            extra = sheet.sample(min(50, len(sheet)), random_state=1).assign(FORNECEDOR=lambda d: d['FORNECEDOR'].astype(str) + ' (novo)')
+            variants = {
+                'mesma': sheet,
+                'reordenada': sheet.sample(frac=1, random_state=2, ignore_index=True),
+                'com linhas removidas': sheet[keep].reset_index(drop=True),
+                'com linhas acrescentadas': pd.concat([sheet.iloc[:len(sheet) // 2], extra, sheet.iloc[len(sheet) // 2:]], ignore_index=True),
+            }
+            timings = []
+            for label, variant in variants.items():
+                variant = apply_schema(variant)
+                novo = store.InputStore(os.path.join(tmp, 'entradas.sqlite'))  # Outro processo, só o disco
+                start = time.perf_counter()
+                apply_overlay(variant, new_overlay('v2', novo.load(store.row_keys(variant))))
+                timings.append((label, (time.perf_counter() - start) * 1000))
+                novo.close()
+            armazem.close()
+        print(f"entradas {n:>9} linhas, {len(editadas)} editadas: " + " | ".join(f"{label} {ms:.1f} ms" for label, ms in timings))
+
+
+# Backend em vários processos: margem e custo de estoque (24 meses) de um conjunto grande com
+# 1, 2, 4 e 8 processos contra o cálculo num processo só, com resultado idêntico. O ganho depende
+# dos núcleos disponíveis (os.cpu_count(), mostrado junto)
+def bench_parallel(sizes=(1_000_000,), workers=(1, 2, 4, 8), taxa=12.0):
+    meses = np.arange(1, 25)
+
+    def serial(df):
+        derived, table = compute_margins(df)
+        return derived, table, holding_cost_matrix(derived['Margem Líquida Inicial (%)'], meses, taxa)
+
+    for n in sizes:
+        df = make_edited_frame(n)
+        serial_s, (derived, table, matriz) = timed(serial, df)
+        timings = []
+        for w in workers:
+            pool = parallel.ComputePool(w, min_rows=0)
+            try:
+                pool.compute(df.iloc[:1000], meses, taxa)  # Sobe os processos antes de medir
+                parallel_s, (p_derived, p_table, p_matriz) = timed(pool.compute, df, meses, taxa)
+            finally:
+                pool.close()
+            pd.testing.assert_frame_equal(p_derived, derived)
+            pd.testing.assert_frame_equal(p_table, table)
+            np.testing.assert_array_equal(p_matriz, matriz)
+            timings.append(f"{w} proc. {parallel_s * 1000:7.1f} ms ({serial_s / parallel_s:4.2f}×)")
+        print(f"paralelo {n:>9} linhas ({os.cpu_count()} CPUs): um processo {serial_s * 1000:7.1f} ms | " + " | ".join(timings))
+
+
+# Custo de uma etapa medida: sem execução em andamento (modo desligado) e com medição
+def bench_profiling(sizes=(100_000,)):
+    def etapas(n):
+        for _ in range(n):
+            with profiling.stage('etapa') as etapa:
+                etapa['rows'] = 1
+
+    for n in sizes:
+        disabled_s, _ = timed(etapas, n)
+        profiling.start_run('benchmark')
+        enabled_s, _ = timed(etapas, n)
+        run = profiling.finish_run()
+        assert len(run['stages']) == 3 * n
+        print(f"medição  {n:>9} etapas: desligada {disabled_s / n * 1e9:7.0f} ns/etapa | ligada {enabled_s / n * 1e9:7.0f} ns/etapa")
+
+
+# Regra de viabilidade avaliada célula a célula, como no laço por fornecedor do dashboard
+def legacy_viability_grid(margens, tempos_estoque_meses, taxas_juros):
+    taxa_equilibrio, tempo_maximo = [], []
+    for margem_liquida_inicial in margens:
+        maiores_taxas, maiores_tempos = [], [0] * len(taxas_juros)
+        for mes in tempos_estoque_meses:
+            maior = np.nan
+            for j, taxa_juros_anual in enumerate(taxas_juros):
+                if margem_liquida_inicial == 0.0:
+                    continue
+                if max(0, margem_liquida_inicial - (taxa_juros_anual / 12.0) * (mes - 1)) > taxa_juros_anual:
+                    maior = taxa_juros_anual if np.isnan(maior) else max(maior, taxa_juros_anual)
+                    maiores_tempos[j] = max(maiores_tempos[j], mes)
+            maiores_taxas.append(maior)
+        taxa_equilibrio.append(maiores_taxas)
+        tempo_maximo.append(maiores_tempos)
+    return np.array(taxa_equilibrio, dtype=float), np.array(tempo_maximo)
+
+
+# Cubo fornecedores × 24 meses × 101 taxas: um cenário por execução (matriz de estoque por taxa)
+# contra o cubo inteiro por broadcasting; paridade com o laço célula a célula numa amostra
+def bench_scenarios(sizes=(10_000,), amostra=200):
+    meses, taxas = np.arange(1, 25), np.linspace(0.0, 50.0, 101)
+    for n in sizes:
+        margens = compute_margins(make_edited_frame(n))[0]['Margem Líquida Inicial (%)'].to_numpy()
+        legacy = legacy_viability_grid(margens[:amostra], meses, taxas)
+        cube_s, (taxa_equilibrio, tempo_maximo) = timed(scenario_surfaces, margens, meses, taxas, repeat=1)
+        np.testing.assert_array_equal(legacy[0], taxa_equilibrio[:amostra])
+        np.testing.assert_array_equal(legacy[1], tempo_maximo[:amostra])
+
+        def por_cenario():
+            return [np.nan_to_num(holding_cost_matrix(margens, meses, taxa)) > taxa for taxa in taxas]
+        scenario_s, _ = timed(por_cenario, repeat=1)
+        cells = n * len(meses) * len(taxas)
+        print(f"cenários {n:>9} fornecedores × {len(meses)} × {len(taxas)}: um por vez {scenario_s * 1000:9.1f} ms | "
+              f"cubo {cube_s * 1000:9.1f} ms ({cells / cube_s / 1e6:6.1f} M células/s)")
+
+
+# Snapshot local: leitura mapeada em memória, revalidação por hash/ETag e invalidação (os pedidos
+# ao servidor e o resultado de cada caso são verificados em tests/test_loader.py)
+def bench_snapshot(sizes=SIZES):
+    for n in sizes:
+        for etag in (False, True):
+            payloads = {'/sheet.csv': make_sheet_csv(n)}
+            with serve(payloads, etag=etag) as base_url, tempfile.TemporaryDirectory() as snapshot_dir:
+                url = f'{base_url}/sheet.csv'
+                cold_s, _ = timed(load_suppliers, url, snapshot_dir, repeat=1)
+                # Dentro de max_age: nenhum pedido ao servidor
+                warm_s, _ = timed(load_suppliers, url, snapshot_dir)
+                # Revalidação com conteúdo igual: um pedido, sem reprocessar (304 ou mesmo hash)
+                invalidate_snapshot(url, snapshot_dir)
+                check_s, _ = timed(load_suppliers, url, snapshot_dir, repeat=1)
+
+            mode = 'etag' if etag else 'hash'
+            print(f"snapshot {n:>9} linhas ({mode}): busca {cold_s * 1000:9.1f} ms | snapshot {warm_s * 1000:7.1f} ms | "
+                  f"revalidação {check_s * 1000:7.1f} ms")
+
+
+# Várias abas carregadas em sequência (urllib, uma conexão por pedido) contra o carregador
+# paralelo com pool de conexões, com latência injetada em cada resposta do servidor local
+def bench_sources(sizes=SIZES, n_sources=8, latency=0.2):
+    for n in sizes:
+        payloads = {f'/planilha/{gid}.csv': make_sheet_csv(n, seed=gid) for gid in range(n_sources)}
+        sources = [('planilha', gid, f'Aba {gid}') for gid in range(n_sources)] + [('planilha', 'inexistente', 'Aba inexistente')]
+        with serve(payloads, latency=latency) as base_url, tempfile.TemporaryDirectory() as sequential_dir, \
+                tempfile.TemporaryDirectory() as concurrent_dir:
+            url_template = base_url + '/{spreadsheet_id}/{gid}.csv'
+
+            def sequential():
+                frames = []
+                for spreadsheet_id, gid, label in sources:
+                    try:
+                        df, _ = load_suppliers(url_template.format(spreadsheet_id=spreadsheet_id, gid=gid), sequential_dir)
+                    except Exception:
+                        continue
+                    frames.append(df.assign(FONTE=label))
+                return apply_schema(pd.concat(frames, ignore_index=True))
+
+            pool = ConnectionPool()
+            sequential_s, expected = timed(sequential, repeat=1)
+            concurrent_s, (df, errors, _) = timed(
+                lambda: load_sources(sources, concurrent_dir, url_template=url_template, pool=pool), repeat=1)
+            pool.close()
+            assert list(errors) == ['Aba inexistente'], errors
+            pd.testing.assert_frame_equal(expected, df)
+        print(f"fontes   {n:>9} linhas × {n_sources} abas (+1 com erro, {latency * 1000:.0f} ms de latência): "
+              f"sequencial {sequential_s * 1000:9.1f} ms | paralelo {concurrent_s * 1000:9.1f} ms")
+
+
+# Edições pontuais no editor com metade das linhas com entradas gravadas: primeira execução da
+# sessão, execução sem edições novas (filtros, controles) e recálculo incremental das linhas
+# alteradas contra o recálculo completo, conferindo que ambos chegam ao mesmo resultado
+def bench_incremental(sizes=SIZES, n_edits=20):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        df = make_edited_frame(n)
+        base_derived, base_table = compute_margins(df)
+        price = df.columns.get_loc('PREÇO DE VENDA')
+        stored = rng.choice(n, n // 2, replace=False)
+        prices = rng.uniform(1, 500, len(stored))
+        overlay = new_overlay('v1', {'PREÇO DE VENDA': (base_derived.index[stored].to_numpy(), prices)})
+        df.iloc[stored, price] = prices
+        state = {}
+        first_s, _ = timed(lambda: update_margin_patch(state, base_derived, overlay), repeat=1)
+        rerun_s, _ = timed(lambda: combine_margins(base_derived, base_table, update_margin_patch(state, base_derived, overlay)))
+        incremental_ms, full_ms = [], []
+        for _ in range(n_edits):
+            pos = int(rng.integers(0, n))
+            value = float(rng.uniform(1, 500))
+            record_edits(overlay, base_derived.index, {pos: {'PREÇO DE VENDA': value}})
+            df.iloc[pos, price] = value
+            incremental_s, (derived, table) = timed(
+                lambda: combine_margins(base_derived, base_table, update_margin_patch(state, base_derived, overlay)), repeat=1
+            )
+            incremental_ms.append(incremental_s * 1000)
+            full_s, (full_derived, full_table) = timed(compute_margins, df, repeat=1)
+            full_ms.append(full_s * 1000)
+        pd.testing.assert_frame_equal(full_derived, derived)
+        pd.testing.assert_frame_equal(full_table, table)
+        print(f"edição   {n:>9} linhas ({len(stored)} com entradas): completo {np.median(full_ms):9.1f} ms | primeira execução {first_s * 1000:7.1f} ms | "
+              f"sem edições {rerun_s * 1000:7.1f} ms | incremental {np.median(incremental_ms):7.1f} ms (1 linha)")
+
+
+# Tamanho serializado e tempo de montagem do gráfico "Margem de Lucro por Peso" em cada modo
+# (o limite de tamanho é verificado em tests/test_charts.py)
+def bench_chart(sizes=SIZES):
+    for n in sizes:
+        derived, _ = compute_margins(make_edited_frame(n))
+        for mode in BAR_MODES:
+            build_s, (fig, used_mode) = timed(build_margin_bar_figure, derived, mode)
+            payload = len(fig.to_json())
+            print(f"gráfico  {n:>9} linhas: {mode:<18} -> {used_mode:<18} {payload / 1024:8.1f} KiB | {build_s * 1000:7.1f} ms")
+
+
+# Memória por sessão (dados carregados + filtrados + editados + colunas derivadas): tipos
+# anteriores (texto em object, tudo em float64) contra o esquema tipado, com float64 e float32
+def bench_memory(sizes=SIZES):
+    def session_bytes(df, float_dtype):
+        margins.DERIVED_FLOAT_DTYPE = float_dtype
+        derived, table = compute_margins(df)
+        frames = [df, df.copy(), derived, table]
+        return sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+
+    original_dtype = margins.DERIVED_FLOAT_DTYPE
+    try:
+        for n in sizes:
+            typed = make_edited_frame(n)
+            legacy = typed.astype({col: object for col in typed.columns if not pd.api.types.is_numeric_dtype(typed[col])})
+            before = session_bytes(legacy, 'float64')
+            after64 = session_bytes(typed, 'float64')
+            after32 = session_bytes(typed, 'float32')
+            print(f"memória  {n:>9} linhas por sessão: anterior {before / 2**20:8.1f} MiB | tipado {after64 / 2**20:8.1f} MiB "
+                  f"({before / after64:4.1f}x) | tipado+float32 {after32 / 2**20:8.1f} MiB ({before / after32:4.1f}x)")
+    finally:
+        margins.DERIVED_FLOAT_DTYPE = original_dtype
+
+
+# Memória alocada (heap do Python/NumPy + pool do Arrow, onde ficam as strings)
+def allocated_bytes():
+    return tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes()
+
+
+# Sessões simuladas no modelo anterior: st.cache_data entrega uma cópia dos dados a cada sessão,
+# os custos são criados nela e o motor de margem copia o DataFrame editado inteiro
+def legacy_session(cached, rng):
+    df = cached.copy()
+    for col in COST_COLUMNS:
+        df[col] = 0.0
+    edited = df.copy()  # st.data_editor devolve uma cópia
+    edited.iloc[rng.integers(0, len(df), 20), edited.columns.get_loc('PREÇO DE VENDA')] = 10.0
+    derived, table = compute_margins(edited.copy())
+    return df, edited, derived, table
+
+
+# Processo no modelo atual: o conjunto, a base do editor e as margens sem entradas, uma vez
+def shared_process(df):
+    base = apply_overlay(df, new_overlay(None))
+    return (base, *compute_margins(base))
+
+
+# Sessões no modelo atual: cada uma guarda só a camada esparsa de entradas e as linhas
+# recalculadas com elas; as tabelas de cada execução (editor, resultado combinado) são temporárias
+def shared_session(shared, rng):
+    base, derived, table = shared
+    overlay = new_overlay('v')
+    record_edits(overlay, base.index, {int(pos): {'PREÇO DE VENDA': 10.0} for pos in rng.integers(0, len(base), 20)})
+    state = {}
+    update_margin_patch(state, derived, overlay)
+    combine_margins(derived, table, state['patch'])
+    return overlay, state
+
+
+# Teste de carga: memória total com 1, 10 e 50 sessões simultâneas em cada modelo e o custo de
+# cada sessão a mais
+def bench_sessions(sizes=SIZES, session_counts=(1, 10, 50)):
+    for n in sizes:
+        base = clean_supplier_frame(read_supplier_csv(io.BytesIO(make_sheet_csv(n))))
+        for name, process, session in (('anterior', pd.DataFrame.copy, legacy_session), ('compartilhado', shared_process, shared_session)):
+            rng = np.random.default_rng(0)
+            tracemalloc.start()
+            start = allocated_bytes()
+            shared = process(base)  # o que fica no cache do processo
+            sessions, report, used = [], [], {}
+            for count in range(1, max(session_counts) + 1):
+                sessions.append(session(shared, rng))
+                used[count] = allocated_bytes() - start
+                if count in session_counts:
+                    report.append(f"{count:>2} sessões {used[count] / 2**20:8.1f} MiB")
+            tracemalloc.stop()
+            del sessions, shared
+            per_session = (used[max(session_counts)] - used[1]) / (max(session_counts) - 1)
+            print(f"sessões  {n:>9} linhas ({name:<13}): " + " | ".join(report) + f" | {per_session / 2**10:9.1f} KiB por sessão")
+
+
+BENCHMARKS = {
+    'ingestion': bench_ingestion,
+    'margins': bench_margins,
+    'parser': bench_parser,
+    'holding': bench_holding,
+    'snapshot': bench_snapshot,
+    'sources': bench_sources,
+    'incremental': bench_incremental,
+    'chart': bench_chart,
+    'memory': bench_memory,
+    'sessions': bench_sessions,
+    'scenarios': bench_scenarios,
+    'serialization': bench_serialization,
+    'profiling': bench_profiling,
+    'stages': bench_stages,
+    'refresh': bench_refresh,
+    'inputs': bench_inputs,
+    'startup': bench_startup,
+    'parallel': bench_parallel,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Dashboard de Viabilidade")
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK', help=f"Um ou mais de: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--sizes', type=int, nargs='+', help="Tamanhos (linhas ou fornecedores); cada benchmark tem os seus por padrão")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f"Arquivo de referência da suíte por etapa (padrão: {BASELINE_FILE})")
+    parser.add_argument('--save-baseline', action='store_true', help="Gravar os resultados como nova referência em vez de comparar")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Piora tolerada por etapa antes de acusar regressão (padrão: 0.5 = 50%%)")
+    parser.add_argument('--serve', type=int, metavar='LINHAS', help="Só servir uma planilha sintética com LINHAS linhas para o dashboard")
+    args = parser.parse_args()
+
+    if args.serve:
+        with serve({sheet_export_path(): make_fornecedor2_csv(args.serve)}) as base_url:
+            print(f"DASHBOARD_SHEET_URL='{base_url}{sheet_export_path('{spreadsheet_id}', '{gid}')}' streamlit run dashboard.py")
+            threading.Event().wait()
+
+    results = {'timings': {}, 'checksums': {}}
+    for name in args.benchmarks or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"benchmark desconhecido: {name}")
+        result = BENCHMARKS[name](args.sizes) if args.sizes else BENCHMARKS[name]()
+        for key, values in (result or {}).items():
+            results[key].update(values)
+    if not results['timings']:
+        return
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), **results}, f, indent=2, ensure_ascii=False)
+        print(f"Referência gravada em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare_baseline(results, json.load(f), args.threshold)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print(f"Sem regressões acima de {args.threshold:.0%} em relação a {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
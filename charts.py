@@ -0,0 +1,273 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Definir uma paleta de cores para as barras e linhas
+COLORS = ['#FF9999', '#66B2FF', '#99FF99', '#FFCC99']  # Paleta com 4 cores diferentes
+
+# Modos do gráfico "Margem de Lucro por Peso"
+BAR_MODES = ['Detalhado', 'Maiores e Menores', 'Por Produto', 'Por Fornecedor', 'Por Faixa de Peso', 'Histograma']
+
+# Acima deste número de barras, o modo detalhado vira histograma e os agrupamentos mostram
+# só os grupos extremos, para que o tamanho do gráfico não cresça com a planilha.
+# DASHBOARD_MAX_BARS muda o limite
+MAX_BARS = int(os.environ.get('DASHBOARD_MAX_BARS', '2000'))
+
+# Número de faixas do histograma e limites das faixas de peso (kg da unidade)
+HISTOGRAM_BINS = 50
+WEIGHT_BUCKETS = [0, 1, 5, 10, 25, 50, 100, np.inf]
+WEIGHT_BUCKET_LABELS = [f"{lo}–{hi} kg" if np.isfinite(hi) else f"{lo} kg ou mais" for lo, hi in zip(WEIGHT_BUCKETS, WEIGHT_BUCKETS[1:])]
+
+# Colunas exibidas no tooltip de cada barra do modo detalhado
+HOVER_COLUMNS = [
+    'MÉDIA/KG', 'PREÇO DE VENDA', 'QUANTIDADE MÍNIMA (Embalagens)', 'Peso Total (kg)', 'Custo Total (R$)',
+    'Custo Total por kg (R$/kg)', 'Lucro Bruto Total (R$)', 'Lucro Líquido Total (R$)', 'Volume Total Ocupado (m³)'
+]
+
+
+# Uma barra por linha, usando "KG da Unidade" como identificador, com tooltips
+def _detailed_bar(df):
+    return go.Bar(
+        x=df['KG da Unidade'].astype(str) + ' kg (' + df['FORNECEDOR'].astype(str) + ' - ' + df['MARCA'].astype(str) + ')',
+        y=df['Margem de Lucro (%)'],
+        name='Margem de Lucro (%)',
+        marker_color=[COLORS[i % len(COLORS)] for i in range(len(df))],  # Atribuir uma cor diferente para cada barra
+        text=df['Margem de Lucro (%)'].round(2),
+        textposition='auto',
+        hovertemplate=(
+            "<b>%{x}</b><br>" +
+            "Margem de Lucro: %{y:.2f}%<br>" +
+            "Preço de Compra: R$%{customdata[0]:.2f}/kg<br>" +
+            "Preço de Venda: R$%{customdata[1]:.2f}/kg<br>" +
+            "Quantidade Mínima (Embalagens): %{customdata[2]:.0f}<br>" +
+            "Peso Total: %{customdata[3]:.2f} kg<br>" +
+            "Custo Total: R$%{customdata[4]:.2f}<br>" +
+            "Custo Total por kg: R$%{customdata[5]:.2f}/kg<br>" +
+            "Lucro Bruto Total: R$%{customdata[6]:.2f}<br>" +
+            "Lucro Líquido Total: R$%{customdata[7]:.2f}<br>" +
+            "Volume Total Ocupado: %{customdata[8]:.2f} m³"
+        ),
+        customdata=df[HOVER_COLUMNS].values
+    )
+
+
+# Margem de lucro mínima, mediana e máxima por grupo, calculadas no servidor
+def aggregate_margins(df, by):
+    if by == 'Por Faixa de Peso':
+        keys = pd.cut(df['KG da Unidade'], WEIGHT_BUCKETS, right=False, labels=WEIGHT_BUCKET_LABELS)
+    else:
+        keys = df['PRODUTO' if by == 'Por Produto' else 'FORNECEDOR']
+    grouped = df['Margem de Lucro (%)'].groupby(keys, observed=True, sort=False)
+    return grouped.agg(['min', 'median', 'max', 'count']).sort_values('median', ascending=False)
+
+
+# Manter só as `n` primeiras e `n` últimas linhas de uma tabela já ordenada
+def _extremes(df, n):
+    return df if len(df) <= 2 * n else pd.concat([df.head(n), df.tail(n)])
+
+
+# As `n` maiores e as `n` menores margens, em ordem decrescente, sem ordenar a tabela inteira
+def top_bottom(df, n, column='Margem de Lucro (%)'):
+    if len(df) <= 2 * n:
+        return df.sort_values(column, ascending=False)
+    return pd.concat([df.nlargest(n, column), df.nsmallest(n, column).iloc[::-1]])
+
+
+# Barra com a mediana do grupo e barras de erro até o mínimo e o máximo
+def _aggregated_bar(stats):
+    return go.Bar(
+        x=stats.index.astype(str),
+        y=stats['median'],
+        name='Margem de Lucro (%)',
+        marker_color=[COLORS[i % len(COLORS)] for i in range(len(stats))],
+        error_y=dict(type='data', symmetric=False, array=stats['max'] - stats['median'], arrayminus=stats['median'] - stats['min']),
+        customdata=stats[['min', 'max', 'count']].values,
+        hovertemplate=(
+            "<b>%{x}</b><br>" +
+            "Mediana: %{y:.2f}%<br>" +
+            "Mínima: %{customdata[0]:.2f}%<br>" +
+            "Máxima: %{customdata[1]:.2f}%<br>" +
+            "Linhas: %{customdata[2]}<extra></extra>"
+        )
+    )
+
+
+# Histograma calculado no servidor: só as contagens por faixa vão para o navegador
+def _histogram_bar(df, bins=HISTOGRAM_BINS):
+    margens = df['Margem de Lucro (%)'].to_numpy(dtype=float)
+    margens = margens[np.isfinite(margens)]
+    counts, edges = np.histogram(margens, bins=bins)
+    return go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        name='Fornecedores',
+        marker_color=COLORS[1],
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="Margem de %{customdata[0]:.2f}% a %{customdata[1]:.2f}%<br>Linhas: %{y}<extra></extra>"
+    )
+
+
+# Montar o gráfico "Margem de Lucro por Peso" no modo escolhido. Devolve a figura e o modo
+# efetivamente usado (o detalhado vira histograma acima de max_bars linhas)
+def build_margin_bar_figure(df, mode='Detalhado', top_n=20, max_bars=MAX_BARS):
+    if mode == 'Detalhado' and len(df) > max_bars:
+        mode = 'Histograma'
+
+    if mode == 'Detalhado':
+        trace = _detailed_bar(df)
+        xaxis_title = "Peso (KG da Unidade) e Fornecedor (Marca)"
+    elif mode == 'Maiores e Menores':
+        trace = _detailed_bar(top_bottom(df, min(top_n, max_bars // 2)))
+        xaxis_title = f"{top_n} maiores e {top_n} menores margens: Peso (KG da Unidade) e Fornecedor (Marca)"
+    elif mode == 'Histograma':
+        trace = _histogram_bar(df)
+        xaxis_title = "Margem de Lucro (%)"
+    else:
+        trace = _aggregated_bar(_extremes(aggregate_margins(df, mode), max_bars // 2))
+        xaxis_title = f"{mode.replace('Por ', '')} (mediana, mínimo e máximo)"
+
+    fig = go.Figure(trace)
+    fig.update_layout(
+        xaxis_title=xaxis_title,
+        yaxis_title="Linhas" if mode == 'Histograma' else "Margem de Lucro (%)",
+        height=400,
+        xaxis=dict(
+            tickangle=45,  # Rotacionar as etiquetas do eixo X em 45 graus
+            tickfont=dict(size=8)  # Tamanho da fonte ajustado
+        ),
+        showlegend=False  # Não precisamos de legenda, pois há apenas uma série de dados
+    )
+    return fig, mode
+
+
+# Acima deste número de fornecedores, o mapa de calor mostra só os extremos da superfície
+MAX_HEATMAP_ROWS = 200
+
+
+# Mapa de calor de uma superfície fornecedores × (meses ou taxas), com os fornecedores em ordem
+# decrescente da média da linha; acima de max_rows, só as max_rows / 2 primeiras e últimas linhas
+def build_scenario_heatmap(surface, labels, x, xaxis_title, value_title, max_rows=MAX_HEATMAP_ROWS):
+    surface = np.asarray(surface, dtype=float)
+    ordem = np.argsort(-np.nan_to_num(surface, nan=-1.0).mean(axis=1), kind='stable')
+    if len(ordem) > max_rows:
+        ordem = np.concatenate([ordem[:max_rows // 2], ordem[-(max_rows // 2):]])
+    # Linhas por posição (rótulos podem se repetir entre produtos), com o rótulo no eixo e no tooltip
+    rotulos = np.asarray(labels, dtype=object)[ordem]
+    linhas = np.arange(len(ordem))
+    fig = go.Figure(go.Heatmap(
+        z=surface[ordem],
+        x=x,
+        y=linhas,
+        customdata=np.repeat(rotulos[:, None], surface.shape[1], axis=1),
+        colorscale='RdYlGn',
+        colorbar=dict(title=value_title),
+        hovertemplate="<b>%{customdata}</b><br>" + xaxis_title + ": %{x}<br>" + value_title + ": %{z}<extra></extra>"
+    ))
+    fig.update_layout(
+        xaxis_title=xaxis_title,
+        height=max(400, len(ordem) * 12),
+        yaxis=dict(autorange='reversed', tickmode='array', tickvals=linhas, ticktext=rotulos, tickfont=dict(size=8))
+    )
+    return fig
+
+
+# Acima deste número de fornecedores, o gráfico de tempo de estoque usa um único traço
+MAX_CURVE_TRACES = 50
+
+
+# Gráfico "Margem Líquida Ajustada em Função do Tempo de Estoque": uma curva por fornecedor
+# (linhas da matriz fornecedores × meses) e a linha da taxa de juros anual
+def build_holding_curves_figure(curvas, rotulos, meses, taxa_juros_anual, max_traces=MAX_CURVE_TRACES):
+    fig = go.Figure()
+
+    # Uma linha por fornecedor; acima de max_traces, todas as curvas vão num único traço
+    # separado por lacunas, para que planilhas com milhares de fornecedores continuem interativas
+    if len(rotulos) <= max_traces:
+        for i, (rotulo, margem_liquida_valores) in enumerate(zip(rotulos, curvas)):
+            fig.add_trace(go.Scatter(
+                x=meses,
+                y=margem_liquida_valores,
+                mode='lines+markers',
+                name=f"Margem Líquida - {rotulo}",
+                line=dict(color=COLORS[i % len(COLORS)]),
+                hovertemplate=(
+                    "<b>%{x} meses</b><br>" +
+                    "Margem Líquida: %{y:.2f}%<br>" +
+                    "Fornecedor: " + rotulo
+                )
+            ))
+    else:
+        # Coluna extra de NaN ao fim de cada linha interrompe a curva entre fornecedores
+        n_meses = len(meses) + 1
+        fig.add_trace(go.Scattergl(
+            x=np.tile(np.append(meses, np.nan), len(rotulos)),
+            y=np.column_stack([curvas, np.full(len(rotulos), np.nan)]).ravel(),
+            customdata=np.repeat(rotulos, n_meses),
+            mode='lines',
+            name="Margem Líquida",
+            line=dict(color=COLORS[1], width=1),
+            opacity=0.5,
+            hovertemplate=(
+                "<b>%{x} meses</b><br>" +
+                "Margem Líquida: %{y:.2f}%<br>" +
+                "Fornecedor: %{customdata}<extra></extra>"
+            )
+        ))
+
+    # Adicionar uma linha horizontal para a taxa de juros anual
+    fig.add_shape(
+        type="line",
+        x0=meses[0],
+        y0=taxa_juros_anual,
+        x1=meses[-1],
+        y1=taxa_juros_anual,
+        line=dict(
+            color="red",
+            width=2,
+            dash="dash"
+        ),
+        name="Taxa de Juros Anual"
+    )
+
+    # Adicionar uma anotação para a linha da taxa de juros
+    fig.add_annotation(
+        x=meses[-1],
+        y=taxa_juros_anual,
+        text=f"Taxa de Juros: {taxa_juros_anual}%",
+        showarrow=True,
+        arrowhead=1,
+        ax=20,
+        ay=-30
+    )
+
+    # Limite superior do eixo Y: maior margem positiva das curvas, ou 200 se não houver nenhuma
+    margens_positivas = curvas[curvas > 0]
+    y_max_margem_liquida = margens_positivas.max() if margens_positivas.size else 200
+
+    # Ajustar o layout do gráfico
+    fig.update_layout(
+        xaxis_title="Tempo de Estoque (Meses)",
+        yaxis_title="Margem Líquida Ajustada (%)",
+        height=500,
+        legend=dict(
+            x=0.01,
+            y=0.99,
+            bgcolor='rgba(255, 255, 255, 0.5)',
+            bordercolor='rgba(0, 0, 0, 0.5)'
+        ),
+        xaxis=dict(
+            tickmode='linear',
+            tick0=1,
+            dtick=1,
+            gridcolor='lightgrey'
+        ),
+        yaxis=dict(
+            range=[0, y_max_margem_liquida]  # Ajustar o limite superior
+        ),
+        yaxis_showgrid=True,
+        yaxis_gridcolor='lightgrey'
+    )
+    return fig
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from inputs import apply_overlay, new_overlay
+from loader import apply_schema, clean_supplier_frame, read_supplier_csv
+from margins import compute_margin_columns, iter_viability_report
+
+# Modo em lote, sem Streamlit nem Plotly: lê a planilha de fornecedores (CSV no formato da
+# exportação do Google Sheets, ou Parquet já limpo) em blocos, calcula as margens e grava o
+# relatório de viabilidade para cada combinação de tempo de estoque e taxa de juros.
+#
+#   python cli.py fornecedores.csv -o viabilidade.parquet --tempos 1-24 --taxas 0,10.5,20
+
+# Linhas lidas por bloco; a memória usada não depende do tamanho da planilha
+CHUNKSIZE = 50_000
+
+
+# Interpretar "1-24", "3,6,12" ou combinações ("1-6,12,24") como uma lista de números; um
+# intervalo vai de 1 em 1 a partir do início, sem passar do fim ("10.5-12" -> 10.5, 11.5)
+def parse_values(text, cast=float):
+    values = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        if sep:
+            start, end = cast(start), cast(end)
+            values.extend(cast(v) for v in np.arange(start, end + 1) if v <= end)
+        else:
+            values.append(cast(part))
+    if not values:
+        raise argparse.ArgumentTypeError(f"Lista vazia: {text!r}")
+    return values
+
+
+# Blocos de fornecedores já limpos (mesmo tratamento do dashboard), a partir de um CSV bruto
+# (arquivo local ou URL) ou de um Parquet com as colunas já numéricas
+def iter_supplier_chunks(path, chunksize=CHUNKSIZE, timeout=60):
+    if path.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield apply_schema(batch.to_pandas())
+        return
+
+    if path.startswith(('http://', 'https://')):
+        stream = urllib.request.urlopen(path, timeout=timeout)
+    elif path == '-':
+        stream = sys.stdin.buffer
+    else:
+        stream = open(path, 'rb')
+    with stream:
+        for chunk in read_supplier_csv(stream, chunksize=chunksize):
+            yield clean_supplier_frame(chunk)
+
+
+# Gravação incremental do relatório em Parquet (um row group por bloco) ou CSV
+class ReportWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith('.parquet')
+        self._writer = None
+        self.rows = 0
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Processar a planilha bloco a bloco; devolve o número de fornecedores e de linhas gravadas
+def run_batch(path, output, tempos_estoque, taxas_juros, modo='linear', chunksize=CHUNKSIZE):
+    writer = ReportWriter(output)
+    fornecedores = 0
+    try:
+        for chunk in iter_supplier_chunks(path, chunksize):
+            derived = compute_margin_columns(apply_overlay(chunk, new_overlay(None)))
+            fornecedores += len(derived)
+            for cenario in iter_viability_report(derived, tempos_estoque, taxas_juros, modo):
+                writer.write(cenario)
+    finally:
+        writer.close()
+    return fornecedores, writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de viabilidade dos fornecedores em lote, sem o dashboard.")
+    parser.add_argument('entrada', help="CSV bruto da planilha (arquivo, URL ou '-' para stdin) ou Parquet já limpo")
+    parser.add_argument('-o', '--saida', required=True, help="Arquivo de saída (.parquet ou .csv)")
+    parser.add_argument('--tempos', type=lambda text: parse_values(text, int), default=[1], help="Tempos de estoque em meses, ex.: 1-24 ou 3,6,12 (padrão: 1)")
+    parser.add_argument('--taxas', type=parse_values, default=[10.0], help="Taxas de juros anuais em %%, ex.: 0,10.5,20 (padrão: 10)")
+    parser.add_argument('--modo', choices=['linear', 'compound'], default='linear', help="Juros simples (linear) ou compostos (compound)")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help=f"Linhas lidas por bloco (padrão: {CHUNKSIZE})")
+    args = parser.parse_args(argv)
+
+    if not args.saida.lower().endswith(('.parquet', '.csv')):
+        parser.error("A saída deve terminar em .parquet ou .csv")
+    if os.path.exists(args.saida):
+        os.remove(args.saida)
+
+    inicio = time.perf_counter()
+    fornecedores, linhas = run_batch(args.entrada, args.saida, args.tempos, args.taxas, args.modo, args.chunksize)
+    print(
+        f"{fornecedores} fornecedores × {len(args.tempos)} tempos × {len(args.taxas)} taxas: "
+        f"{linhas} linhas gravadas em {args.saida} ({time.perf_counter() - inicio:.1f} s)",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import streamlit as st
+
+# Configuração das colunas das tabelas do dashboard. Montada uma vez por processo, na importação,
+# e compartilhada por todas as execuções e sessões (o Streamlit copia cada configuração ao usar)
+
+# Tabela editável com larguras ajustadas
+EDITOR_COLUMN_CONFIG = {
+    "PRODUTO": st.column_config.TextColumn(width=100),
+    "FORNECEDOR": st.column_config.TextColumn(width=100),
+    "MARCA": st.column_config.TextColumn(width=100),
+    "KG da Unidade": st.column_config.NumberColumn(width=100, format="%.2f"),
+    "UNIDADE/EMBALAGEM": st.column_config.TextColumn(width=150),
+    "VALOR UNITÁRIO": st.column_config.NumberColumn(width=100, format="%.2f"),
+    "MÉDIA/KG": st.column_config.NumberColumn(width=100, format="%.2f"),
+    "VALOR/EMBALAGEM": st.column_config.NumberColumn(width=120, format="%.2f"),
+    "VALOR/TONELADA": st.column_config.NumberColumn(width=120, format="%.2f"),
+    "QUANTIDADE MÍNIMA (Embalagens)": st.column_config.NumberColumn(
+        "QUANTIDADE MÍNIMA (Embalagens)",
+        help="Insira a quantidade mínima em número de embalagens",
+        format="%.0f",
+        required=False,
+        width=150
+    ),
+    "PREÇO DE VENDA": st.column_config.NumberColumn(
+        "PREÇO DE VENDA",
+        help="Insira o preço de venda em R$/kg",
+        format="%.2f",
+        required=False,
+        width=120
+    ),
+    "Logística (R$)": st.column_config.NumberColumn(
+        "Logística (R$)",
+        help="Insira o custo total de logística em R$",
+        format="%.2f",
+        required=False,
+        width=120
+    ),
+    "Impostos (R$)": st.column_config.NumberColumn(
+        "Impostos (R$)",
+        help="Insira o custo total de impostos em R$",
+        format="%.2f",
+        required=False,
+        width=120
+    ),
+    "Aduaneiros (R$)": st.column_config.NumberColumn(
+        "Aduaneiros (R$)",
+        help="Insira o custo total aduaneiro em R$",
+        format="%.2f",
+        required=False,
+        width=120
+    ),
+    "Outros Custos (R$)": st.column_config.NumberColumn(
+        "Outros Custos (R$)",
+        help="Insira outros custos totais em R$",
+        format="%.2f",
+        required=False,
+        width=120
+    ),
+    "Volume/m³": st.column_config.NumberColumn(
+        "Volume/m³",
+        help="Insira o volume por embalagem em metros cúbicos (m³)",
+        format="%.2f",
+        required=False,
+        width=100
+    ),
+    "LOCAL DE ENTREGA": st.column_config.TextColumn(width=150),
+    "FONTE": st.column_config.TextColumn(width=120)
+}
+
+# Tabela "Margem de Lucro"
+MARGIN_TABLE_COLUMN_CONFIG = {
+    'Fornecedor (Marca)': st.column_config.TextColumn(width=150),
+    'Quantidade Mínima (Embalagens)': st.column_config.NumberColumn(width=150, format="%.0f"),
+    'Peso Total (kg)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Preço de Compra (R$/kg)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Preço de Venda (R$/kg)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Valor Total da Venda (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Lucro Bruto Total (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Custo Total (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Custo Total por kg (R$/kg)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Lucro Líquido Total (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Margem de Lucro (%)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Margem Líquida Inicial (%)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Volume Total Ocupado (m³)': st.column_config.NumberColumn(width=150, format="%.2f")
+}
+
+# Tabela "Margem Líquida por Fornecedor"
+HOLDING_TABLE_COLUMN_CONFIG = {
+    'Fornecedor (Marca)': st.column_config.TextColumn(width=150),
+    'Investimento Inicial (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Valor Total da Venda (R$)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Margem Líquida Inicial (%)': st.column_config.TextColumn(width=150),
+    'Margem Líquida Ajustada (%)': st.column_config.TextColumn(width=150),
+    'Taxa de Juros Anual (%)': st.column_config.NumberColumn(width=150, format="%.2f"),
+    'Viável': st.column_config.TextColumn(width=100)
+}
+
+# Tabela de cenários; os títulos de duas colunas dependem dos controles (scenario_column_config)
+SCENARIO_TABLE_COLUMN_CONFIG = {
+    'Fornecedor (Marca)': st.column_config.TextColumn(width=150),
+    'Margem Líquida Inicial (%)': st.column_config.NumberColumn(width=150, format="%.2f"),
+}
+
+# Painel "Performance"
+PERFORMANCE_COLUMN_CONFIG = {
+    "Tempo (ms)": st.column_config.NumberColumn(format="%.1f"),
+    "Memória (MiB)": st.column_config.NumberColumn(format="%+.1f"),
+}
+
+
+# Configuração da tabela de cenários para o tempo de estoque e a taxa de juros escolhidos
+def scenario_column_config(tempo_estoque_meses, taxa_juros_anual):
+    return {
+        **SCENARIO_TABLE_COLUMN_CONFIG,
+        'Taxa de Equilíbrio (%)': st.column_config.NumberColumn(
+            f"Taxa de Equilíbrio em {tempo_estoque_meses} meses (%)", width=200, format="%.1f",
+            help="Maior taxa de juros anual da grade em que o fornecedor ainda é viável"
+        ),
+        'Tempo Máximo Viável (Meses)': st.column_config.NumberColumn(
+            f"Tempo Máximo Viável a {taxa_juros_anual:.1f}% (Meses)", width=200, format="%d",
+            help="Maior tempo de estoque em que o fornecedor ainda é viável (0 se nenhum)"
+        ),
+    }
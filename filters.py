@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+# Colunas com filtro por valor no dashboard
+FILTER_COLUMNS = ['PRODUTO', 'FORNECEDOR', 'LOCAL DE ENTREGA']
+
+
+# Índice de filtros de um conjunto de dados: para cada coluna, os valores distintos em ordem
+# e as posições (crescentes) das linhas de cada valor. Montado uma vez por versão dos dados
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    index = {'rows': len(df), 'columns': {}}
+    for col in columns:
+        values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype('category')
+        codes = values.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories))
+        groups = np.split(order[np.count_nonzero(codes < 0):], np.cumsum(counts)[:-1])
+        positions = {str(value): group for value, group, count in zip(values.cat.categories, groups, counts) if count}
+        index['columns'][col] = {'values': sorted(positions), 'positions': positions}
+    return index
+
+
+# Posições (crescentes) das linhas que atendem a todas as seleções {coluna: valores}.
+# Seleção vazia ou com todos os valores não filtra; None quando nenhuma coluna filtra
+def select_positions(index, selections):
+    positions = None
+    for col, selected in selections.items():
+        groups = index['columns'][col]['positions']
+        selected = [value for value in selected if value in groups]
+        if not selected or len(selected) == len(groups):
+            continue
+        found = np.sort(np.concatenate([groups[value] for value in selected]))
+        positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+    return positions
+
+
+# Posições (crescentes) das linhas com low <= valor <= high; NaN fica de fora. As margens dependem
+# das entradas de cada sessão, então em vez de um índice guardado na sessão é feita uma varredura
+# vetorizada, só quando a faixa é restringida
+def range_positions(values, low, high):
+    values = np.asarray(values, dtype=float)
+    return np.flatnonzero((values >= low) & (values <= high))
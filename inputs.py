@@ -0,0 +1,71 @@
+import numpy as np
+
+from margins import COST_COLUMNS
+
+# Colunas preenchidas pelo analista no editor
+EDITABLE_COLUMNS = ['QUANTIDADE MÍNIMA (Embalagens)', 'PREÇO DE VENDA'] + COST_COLUMNS
+
+
+# Camada esparsa de entradas de uma sessão: id da linha no conjunto compartilhado ->
+# {coluna editável: valor}. Os ids só valem para uma versão dos dados. `base` traz as entradas
+# já gravadas ({coluna: (ids das linhas, valores)}, ver store.InputStore.load), por baixo das
+# edições da sessão. `revision` avança a cada edição e `changed` guarda a revisão da última
+# edição de cada linha, para que quem deriva valores da camada refaça só as linhas novas
+def new_overlay(version, base=None):
+    return {'version': version, 'rows': {}, 'base': base or {}, 'revision': 0, 'changed': {}}
+
+
+# Registrar as edições do st.data_editor (posição -> {coluna: valor}) pelo id de cada linha.
+# Devolve só o que mudou em relação à camada ({id: {coluna: valor}}), para ser gravado
+def record_edits(overlay, row_ids, edited_rows):
+    changed = {}
+    for pos, changes in edited_rows.items():
+        row = overlay['rows'].setdefault(row_ids[pos], {})
+        values = {col: value for col, value in changes.items() if col in EDITABLE_COLUMNS and (col not in row or row[col] != value)}
+        if values:
+            row.update(values)
+            changed[row_ids[pos]] = values
+            overlay['revision'] += 1
+            overlay['changed'][row_ids[pos]] = overlay['revision']
+        elif not row:
+            del overlay['rows'][row_ids[pos]]
+    return changed
+
+
+# Juntar a camada de entradas às linhas do conjunto compartilhado. O DataFrame recebido não é
+# alterado: só as colunas editáveis que faltam ou que têm entradas nestas linhas são criadas, e
+# as demais continuam sendo as do original (sem entradas, o próprio original é devolvido)
+def apply_overlay(df, overlay):
+    columns = {}
+
+    def column(col):
+        if col not in columns:
+            columns[col] = df[col].to_numpy(dtype=float, na_value=np.nan, copy=True) if col in df.columns else np.zeros(len(df))
+        return columns[col]
+
+    for col in EDITABLE_COLUMNS:
+        if col not in df.columns or df[col].dtype != np.float64:
+            column(col)
+    for col, (row_ids, values) in overlay.get('base', {}).items():
+        positions = df.index.get_indexer(row_ids)
+        found = positions >= 0  # Linhas fora do filtro atual ficam de fora
+        if found.any():
+            column(col)[positions[found]] = values[found]
+    rows = overlay['rows']
+    if rows:
+        positions = df.index.get_indexer(list(rows))
+        for pos, values in zip(positions, rows.values()):
+            if pos < 0:  # Linha fora do filtro atual
+                continue
+            for col, value in values.items():
+                column(col)[pos] = np.nan if value is None else value
+    return df.assign(**columns) if columns else df
+
+
+# Ids das linhas com entradas na camada (gravadas ou da sessão); com `since`, só os das linhas
+# editadas depois dessa revisão
+def overlay_row_ids(overlay, since=None):
+    if since is not None:
+        return np.array([row_id for row_id, revision in overlay['changed'].items() if revision > since], dtype=np.int64)
+    ids = [row_ids for row_ids, _ in overlay.get('base', {}).values()]
+    return np.unique(np.concatenate(ids + [np.fromiter(overlay['rows'], dtype=np.int64, count=len(overlay['rows']))]))
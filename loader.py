@@ -0,0 +1,508 @@
+import contextvars
+import csv
+import hashlib
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from profiling import stage
+
+# Planilha e GID da aba "FORNECEDOR2"
+SPREADSHEET_ID = '14l5BdSDd1dFaKyGHAjgJHIQgGbPs9xU_BfxZDFhaTqY'
+GID_FORNECEDOR = '1111839866'  # GID da aba "FORNECEDOR2"
+
+# Modelo da URL de exportação CSV de uma aba do Google Sheets. DASHBOARD_SHEET_URL aponta o
+# dashboard para outro servidor com o mesmo caminho (ex.: python benchmark.py --serve 100000)
+SHEET_EXPORT_URL = os.environ.get('DASHBOARD_SHEET_URL', 'https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}')
+
+# URL de exportação CSV para a aba "FORNECEDOR2"
+url_fornecedores = SHEET_EXPORT_URL.format(spreadsheet_id=SPREADSHEET_ID, gid=GID_FORNECEDOR)
+
+# Fontes de fornecedores: (planilha, GID, rótulo exibido na coluna FONTE)
+FONTES_FORNECEDORES = [
+    (SPREADSHEET_ID, GID_FORNECEDOR, 'FORNECEDOR2'),
+]
+
+# Definir os cabeçalhos esperados da planilha
+fornecedor_headers = [
+    'PRODUTO', 'FORNECEDOR', 'MARCA', 'KG da Unidade', 'UNIDADE/EMBALAGEM', 'VALOR UNITÁRIO',
+    'MÉDIA/KG', 'VALOR/EMBALAGEM', 'VALOR/TONELADA', 'PREÇO DE VENDA',
+    'QUANTIDADE MÍNIMA (Embalagens)', 'LOCAL DE ENTREGA'
+]
+
+TEXT_COLUMNS = ['PRODUTO', 'FORNECEDOR', 'MARCA', 'UNIDADE/EMBALAGEM', 'LOCAL DE ENTREGA']
+NUMERIC_COLUMNS = ['KG da Unidade', 'VALOR UNITÁRIO', 'MÉDIA/KG', 'VALOR/EMBALAGEM', 'VALOR/TONELADA', 'QUANTIDADE MÍNIMA (Embalagens)']
+
+# Esquema de tipos do DataFrame de fornecedores: colunas com poucos valores distintos viram
+# categóricas; os demais textos usam strings em Arrow e os números ficam em float64
+CATEGORY_COLUMNS = ['PRODUTO', 'FORNECEDOR', 'MARCA', 'LOCAL DE ENTREGA', 'FONTE']
+STRING_DTYPE = pd.StringDtype('pyarrow')
+
+# Diretório dos snapshots locais (Arrow) da planilha e idade máxima antes de revalidar
+SNAPSHOT_DIR = os.environ.get('DASHBOARD_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+SNAPSHOT_MAX_AGE = 300  # 5 minutos, o mesmo TTL do cache em memória
+
+# Despejos de depuração no stdout ficam desligados, a menos que DASHBOARD_DEBUG=1
+DEBUG = os.environ.get('DASHBOARD_DEBUG', '') == '1'
+
+
+def debug(*args):
+    if DEBUG:
+        print(*args)
+
+
+# Ajustar os cabeçalhos ao número de colunas realmente presente no CSV
+def adjust_headers(num_columns):
+    if num_columns == len(fornecedor_headers):
+        return list(fornecedor_headers)
+    adjusted_headers = fornecedor_headers[:num_columns]
+    if num_columns > len(fornecedor_headers):
+        adjusted_headers.extend([f'COLUNA_EXTRA_{i}' for i in range(num_columns - len(fornecedor_headers))])
+    debug(f"Cabeçalhos ajustados: {adjusted_headers}")
+    return adjusted_headers
+
+
+# Ler o CSV de um stream binário: a primeira linha (cabeçalho da planilha) só define
+# a largura, e o restante do mesmo stream vai direto para o pandas, sem segundo download
+# Com `chunksize`, devolve um iterador de DataFrames com até `chunksize` linhas cada. Tudo é
+# lido como texto: sem isso, um bloco sem células em branco com "1.234" viraria float no pandas
+# e o ponto de milhar se perderia antes da conversão do formato brasileiro
+def read_supplier_csv(stream, chunksize=None):
+    header_line = stream.readline().decode('utf-8')
+    if not header_line.strip():
+        raise pd.errors.EmptyDataError("CSV sem cabeçalho")
+    num_columns = len(next(csv.reader([header_line])))
+    debug(f"Número de colunas no CSV bruto: {num_columns}")
+
+    adjusted_headers = adjust_headers(num_columns)
+    df = pd.read_csv(stream, names=adjusted_headers, header=None, encoding='utf-8', keep_default_na=False, dtype=str, chunksize=chunksize)
+    if chunksize is None:
+        debug("Dados brutos carregados pelo pandas:")
+        debug(df)
+    return df
+
+
+# Limpar as colunas de texto e numéricas (formato brasileiro "R$ 1.234,56")
+def clean_supplier_frame(df):
+    text_columns = [col for col in TEXT_COLUMNS if col in df.columns]
+    for col in text_columns:
+        df[col] = df[col].astype(str).str.strip()
+
+    numeric_columns = [col for col in NUMERIC_COLUMNS if col in df.columns]
+    parse_brl_columns(df, numeric_columns)
+
+    if 'PREÇO DE VENDA' in df.columns:
+        df['PREÇO DE VENDA'] = pd.to_numeric(df['PREÇO DE VENDA'], errors='coerce').fillna(0.0)
+    df = apply_schema(df)
+    debug("Dados finais preparados para o dashboard:")
+    debug(df)
+    return df
+
+
+# Converter colunas no formato brasileiro ("R$ 1.234,56") numa única passada: as colunas são
+# empilhadas numa só série de texto, limpas e convertidas de uma vez e depois separadas
+def parse_brl_columns(df, columns):
+    if not columns:
+        return df
+    stacked = pd.concat([df[col].astype(str) for col in columns], ignore_index=True)
+    stacked = stacked.str.replace(r'R\$|\.', '', regex=True).str.replace(',', '.', regex=False)
+    values = pd.to_numeric(stacked, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    for col, column_values in zip(columns, values.reshape(len(columns), len(df))):
+        df[col] = column_values
+    return df
+
+
+# Aplicar o esquema de tipos (categóricas e strings em Arrow); usado também depois de
+# concatenar fontes, já que categóricas com categorias diferentes voltam como texto
+def apply_schema(df):
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(STRING_DTYPE)
+    return df
+
+
+# Baixar a planilha uma única vez e devolver o DataFrame limpo
+def fetch_suppliers(url=url_fornecedores, timeout=60):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        df = read_supplier_csv(response)
+    return clean_supplier_frame(df)
+
+
+# Caminhos do snapshot (dados em Arrow IPC + metadados em JSON) de uma URL
+def snapshot_paths(url, snapshot_dir=None):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(snapshot_dir or SNAPSHOT_DIR, f'fornecedores-{key}')
+    return base + '.arrow', base + '.json'
+
+
+def read_snapshot_meta(url, snapshot_dir=None):
+    _, meta_path = snapshot_paths(url, snapshot_dir)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot_meta(meta, meta_path):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+# Ler o snapshot mapeando o arquivo Arrow em memória. As colunas numéricas (e as de texto, em
+# Arrow) apontam direto para o arquivo mapeado, sem cópia: processos que leem o mesmo snapshot
+# compartilham essas páginas. Só as categóricas são montadas no heap
+def read_snapshot(url, snapshot_dir=None):
+    import pyarrow.feather as feather
+
+    data_path, _ = snapshot_paths(url, snapshot_dir)
+    with stage('decode') as etapa:
+        df = apply_schema(feather.read_table(data_path, memory_map=True).to_pandas(split_blocks=True))
+        etapa['rows'] = len(df)
+    return df
+
+
+# Gravar o DataFrame limpo e os metadados (hora da busca, hash do conteúdo, ETag) de forma atômica
+def write_snapshot(url, df, meta, snapshot_dir=None):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    data_path, meta_path = snapshot_paths(url, snapshot_dir)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    tmp_path = data_path + '.tmp'
+    # Um único lote e NaN gravado como valor (não como nulo): assim a leitura não precisa juntar
+    # lotes nem preencher nulos, e as colunas numéricas são lidas sem cópia
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, col in enumerate(table.column_names):
+        if pa.types.is_floating(table.schema.field(i).type) and table.column(i).null_count:
+            table = table.set_column(i, col, pa.array(df[col].to_numpy(), from_pandas=False))
+    feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(len(df), 1))
+    os.replace(tmp_path, data_path)
+    _write_snapshot_meta(meta, meta_path)
+
+
+# Forçar a revalidação do snapshot desta URL na próxima leitura, sem apagá-lo
+def invalidate_snapshot(url, snapshot_dir=None):
+    meta = read_snapshot_meta(url, snapshot_dir)
+    if meta is not None:
+        meta['checked_at'] = 0
+        _write_snapshot_meta(meta, snapshot_paths(url, snapshot_dir)[1])
+
+
+# Buscar a planilha só se ela mudou: pedido condicional por ETag/Last-Modified e, se o
+# servidor não os suportar, comparação do hash do conteúdo com o do snapshot
+def refresh_snapshot(url, snapshot_dir=None, timeout=60, opener=None):
+    meta = read_snapshot_meta(url, snapshot_dir)
+    data_path, meta_path = snapshot_paths(url, snapshot_dir)
+    has_snapshot = meta is not None and os.path.exists(data_path)
+
+    request = urllib.request.Request(url)
+    if has_snapshot and meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if has_snapshot and meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+
+    now = time.time()
+    try:
+        with stage('fetch') as etapa, (opener or urllib.request.urlopen)(request, timeout=timeout) as response:
+            body = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            etapa['bytes'] = len(body)
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not has_snapshot:
+            raise
+        debug("Snapshot ainda válido (304 Not Modified)")
+        meta['checked_at'] = now
+        _write_snapshot_meta(meta, meta_path)
+        return read_snapshot(url, snapshot_dir), meta
+
+    content_hash = hashlib.sha256(body).hexdigest()
+    if has_snapshot and content_hash == meta.get('sha256'):
+        try:
+            df = read_snapshot(url, snapshot_dir)
+        except Exception as e:
+            debug(f"Snapshot ilegível, reprocessando o conteúdo baixado: {e}")
+        else:
+            debug("Snapshot ainda válido (mesmo hash de conteúdo)")
+            meta.update(checked_at=now, etag=etag, last_modified=last_modified)
+            _write_snapshot_meta(meta, meta_path)
+            return df, meta
+
+    with stage('parse') as etapa:
+        df = read_supplier_csv(io.BytesIO(body))
+        etapa['rows'] = len(df)
+    with stage('clean', rows=len(df)):
+        df = clean_supplier_frame(df)
+    meta = {
+        'url': url, 'fetched_at': now, 'checked_at': now, 'sha256': content_hash,
+        'etag': etag, 'last_modified': last_modified, 'rows': len(df),
+    }
+    try:
+        write_snapshot(url, df, meta, snapshot_dir)
+    except Exception as e:
+        # Sem snapshot (ex.: pyarrow ausente ou disco somente leitura), o dashboard segue funcionando
+        debug(f"Não foi possível gravar o snapshot: {e}")
+    return df, meta
+
+
+# Carregar os fornecedores do snapshot local enquanto ele tiver menos de max_age segundos;
+# depois disso, revalidar com o servidor
+def load_suppliers(url=url_fornecedores, snapshot_dir=None, max_age=SNAPSHOT_MAX_AGE, opener=None):
+    meta = read_snapshot_meta(url, snapshot_dir)
+    if meta is not None and time.time() - meta.get('checked_at', 0) < max_age:
+        try:
+            return read_snapshot(url, snapshot_dir), meta
+        except Exception as e:
+            debug(f"Snapshot ilegível, buscando de novo: {e}")
+    return refresh_snapshot(url, snapshot_dir, opener=opener)
+
+
+# Resposta já lida por completo, com a mesma interface usada de urlopen (read, headers, with)
+class PooledResponse(io.BytesIO):
+    def __init__(self, body, status, headers, url):
+        super().__init__(body)
+        self.status = status
+        self.headers = headers
+        self.url = url
+
+
+# Pool de conexões HTTP(S) persistentes (keep-alive) por host, compartilhado entre threads.
+# Substitui urllib.request.urlopen, que abre e fecha uma conexão a cada pedido
+class ConnectionPool:
+    MAX_REDIRECTS = 5
+
+    def __init__(self, max_idle_per_host=8):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc, timeout):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=timeout), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            connections = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+    def _get(self, url, headers, timeout):
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            connection, reused = self._acquire(parts.scheme, parts.netloc, timeout)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # Conexão reaproveitada pode ter sido fechada pelo servidor: tentar uma nova
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response, body
+
+    def urlopen(self, request, timeout=60):
+        if isinstance(request, str):
+            request = urllib.request.Request(request)
+        url, headers = request.full_url, dict(request.header_items())
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response, body = self._get(url, headers, timeout)
+            if response.status in (301, 302, 303, 307, 308):
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            if response.status >= 300:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+            return PooledResponse(body, response.status, response.headers, url)
+        raise urllib.error.HTTPError(url, response.status, "Redirecionamentos demais", response.headers, None)
+
+
+# Pool usado pelo carregador de várias fontes
+connection_pool = ConnectionPool()
+
+
+# Carregar várias abas/planilhas em paralelo, cada uma com seu snapshot, e concatená-las
+# com a coluna FONTE. Uma fonte com erro não derruba as demais: o erro volta em `errors`.
+# `version` identifica o conteúdo carregado (muda quando alguma fonte muda)
+def load_sources(sources=FONTES_FORNECEDORES, snapshot_dir=None, max_age=SNAPSHOT_MAX_AGE,
+                 max_workers=8, url_template=SHEET_EXPORT_URL, pool=connection_pool):
+    def load_one(source):
+        spreadsheet_id, gid, _ = source
+        url = url_template.format(spreadsheet_id=spreadsheet_id, gid=gid)
+        return load_suppliers(url, snapshot_dir, max_age, opener=pool.urlopen)
+
+    frames, errors, content_hashes = [], {}, []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sources)) or 1) as executor:
+        # Cada fonte roda numa cópia do contexto atual, para que suas etapas entrem na medição
+        futures = [(source[2], executor.submit(contextvars.copy_context().run, load_one, source)) for source in sources]
+        for label, future in futures:
+            try:
+                df, meta = future.result()
+            except Exception as e:
+                debug(f"Falha ao carregar a fonte {label}: {e}")
+                errors[label] = e
+                continue
+            frames.append(df.assign(FONTE=label))
+            content_hashes.append(f"{label}:{meta.get('sha256')}")
+
+    version = hashlib.sha1('|'.join(content_hashes).encode('utf-8')).hexdigest()[:16]
+    if not frames:
+        return pd.DataFrame(columns=fornecedor_headers + ['FONTE']), errors, version
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return apply_schema(df), errors, version
+
+
+# URLs de exportação das fontes, para invalidar seus snapshots
+def source_urls(sources=FONTES_FORNECEDORES, url_template=SHEET_EXPORT_URL):
+    return [url_template.format(spreadsheet_id=spreadsheet_id, gid=gid) for spreadsheet_id, gid, _ in sources]
+
+
+# Atualização em segundo plano (stale-while-revalidate): uma thread revalida as fontes a cada
+# `interval` segundos e troca de uma vez o conjunto servido. Quem lê recebe sempre a última
+# versão boa, sem esperar pela rede; só a primeira leitura, sem nenhum conjunto ainda, espera
+# a carga inicial (do snapshot local, se houver). `prepare(df)` roda também na thread, para que
+# estruturas derivadas (ex.: índice dos filtros) cheguem prontas junto com os dados. Cada
+# revalidação é uma execução medida do profiling (busca, decodificação, parse, limpeza), guardada
+# em `last_run` e registrada no log e no arquivo de métricas como as execuções do dashboard
+class SourceRefresher:
+    def __init__(self, sources=FONTES_FORNECEDORES, interval=SNAPSHOT_MAX_AGE, snapshot_dir=None,
+                 url_template=SHEET_EXPORT_URL, pool=connection_pool, prepare=None, retry_interval=60):
+        self.sources = sources
+        self.interval = interval
+        self.retry_interval = min(retry_interval, interval)
+        self.snapshot_dir = snapshot_dir
+        self.url_template = url_template
+        self.pool = pool
+        self.prepare = prepare
+        self.dataset = None  # Trocado inteiro a cada nova versão; nunca alterado no lugar
+        self.status = {'refreshing': False, 'last_attempt': None, 'errors': {}}
+        self.last_run = None  # Medição da última revalidação (profiling)
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='source-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # Pedir uma revalidação imediata (botão "Recarregar Dados"), sem esperar por ela
+    def trigger(self):
+        self._wake.set()
+
+    # Conjunto atual: {'df', 'errors', 'version', 'checked_at', 'prepared'}; checked_at é None
+    # enquanto nenhuma fonte carregou (ex.: primeira carga durante uma queda). Só espera (até
+    # `timeout`) enquanto a carga inicial não terminou; depois disso, devolve na hora
+    def current(self, timeout=None):
+        if self.dataset is None:
+            self.start()._ready.wait(timeout)
+        return self.dataset
+
+    # Idade dos dados em segundos: tempo desde a última confirmação com as planilhas (None sem
+    # nenhum dado carregado)
+    def age(self, now=None):
+        dataset = self.dataset
+        if dataset is None or dataset['checked_at'] is None:
+            return None
+        return (now or time.time()) - dataset['checked_at']
+
+    # Uma revalidação: max_age=0 revalida com o servidor (pedido condicional; o snapshot evita
+    # reprocessar o que não mudou). Uma versão com fontes falhando que a atual não tinha não
+    # substitui a atual: a última versão boa continua sendo servida. Sem nenhuma versão ainda, a
+    # que veio (mesmo vazia) passa a ser servida. Devolve True só se todas as fontes carregaram;
+    # com erro, a próxima tentativa vem depois de `retry_interval` e não de `interval`
+    def refresh(self, max_age=0):
+        # Num contexto vazio, para não misturar a medição com uma execução de quem chamou
+        return contextvars.Context().run(self._measured_refresh, max_age)
+
+    def _measured_refresh(self, max_age):
+        profiling.start_run('refresh')
+        try:
+            return self._refresh(max_age)
+        finally:
+            self.last_run = profiling.finish_run()
+
+    def _refresh(self, max_age):
+        self.status = {**self.status, 'refreshing': True, 'last_attempt': time.time()}
+        try:
+            df, errors, version = load_sources(self.sources, self.snapshot_dir, max_age, url_template=self.url_template, pool=self.pool)
+        except Exception as e:
+            df, errors, version = None, {'*': e}, None
+        self.status = {**self.status, 'refreshing': False, 'errors': errors}
+        dataset = self.dataset
+        if df is None or (dataset is not None and not set(errors) <= set(dataset['errors'])):
+            debug(f"Atualização em segundo plano falhou; mantendo a versão atual: {errors}")
+            return False
+        if dataset is not None and version == dataset['version']:
+            self.dataset = {**dataset, 'checked_at': self._checked_at(errors)}
+        else:
+            prepared = self.prepare(df) if self.prepare is not None else None
+            self.dataset = {'df': df, 'errors': errors, 'version': version, 'checked_at': self._checked_at(errors), 'prepared': prepared}
+        return not errors
+
+    # Confirmação mais antiga entre as fontes, segundo os metadados dos snapshots; None se
+    # nenhuma fonte carregou
+    def _checked_at(self, errors):
+        if '*' in errors or len(errors) >= len(self.sources):
+            return None
+        checked = [
+            (read_snapshot_meta(url, self.snapshot_dir) or {}).get('checked_at')
+            for url in source_urls(self.sources, self.url_template)
+        ]
+        return min((c for c in checked if c), default=time.time())
+
+    def _run(self):
+        # Carga inicial: o snapshot local serve mesmo antigo, e a revalidação vem quando ele
+        # completar `interval` segundos (na hora, se já estiver vencido)
+        ok = self.refresh(max_age=float('inf'))
+        self._ready.set()
+        wait = max(0.0, self.interval - self.age()) if ok else self.retry_interval
+        while not self._stop.is_set():
+            self._wake.wait(wait)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            wait = self.interval if self.refresh() else self.retry_interval
@@ -0,0 +1,363 @@
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+# Colunas editáveis de custos e volume, inicializadas com 0.0 quando ausentes
+COST_COLUMNS = ['Logística (R$)', 'Impostos (R$)', 'Aduaneiros (R$)', 'Outros Custos (R$)', 'Volume/m³']
+
+# Colunas de entrada que precisam ser numéricas antes do cálculo da margem
+INPUT_COLUMNS = [
+    'MÉDIA/KG', 'PREÇO DE VENDA', 'QUANTIDADE MÍNIMA (Embalagens)', 'Logística (R$)', 'Impostos (R$)',
+    'Aduaneiros (R$)', 'Outros Custos (R$)', 'Volume/m³', 'KG da Unidade', 'VALOR/EMBALAGEM'
+]
+
+# Colunas calculadas pelo motor de margem
+DERIVED_COLUMNS = [
+    'Unidades por Embalagem', 'Peso por Unidade (kg)', 'Peso Total por Embalagem (kg)', 'Peso Total (kg)',
+    'Custo Total (R$)', 'Custo Total por kg (R$/kg)', 'Lucro Bruto por kg (R$/kg)', 'Lucro Líquido por kg (R$/kg)',
+    'Margem de Lucro (%)', 'Valor Total da Venda (R$)', 'Lucro Bruto Total (R$)', 'Lucro Líquido Total (R$)',
+    'Margem Líquida Inicial (%)', 'Volume Total Ocupado (m³)'
+]
+
+# Tipo das colunas derivadas em ponto flutuante; DASHBOARD_FLOAT_DTYPE=float32 reduz pela
+# metade a memória dessas colunas por sessão, ao custo de ~7 dígitos significativos
+DERIVED_FLOAT_DTYPE = os.environ.get('DASHBOARD_FLOAT_DTYPE', 'float64')
+
+# Colunas da tabela "Margem de Lucro" e a coluna de origem de cada uma
+MARGIN_TABLE_COLUMNS = {
+    'Quantidade Mínima (Embalagens)': 'QUANTIDADE MÍNIMA (Embalagens)',
+    'Peso Total (kg)': 'Peso Total (kg)',
+    'Preço de Compra (R$/kg)': 'MÉDIA/KG',
+    'Preço de Venda (R$/kg)': 'PREÇO DE VENDA',
+    'Valor Total da Venda (R$)': 'Valor Total da Venda (R$)',
+    'Lucro Bruto Total (R$)': 'Lucro Bruto Total (R$)',
+    'Custo Total (R$)': 'Custo Total (R$)',
+    'Custo Total por kg (R$/kg)': 'Custo Total por kg (R$/kg)',
+    'Lucro Líquido Total (R$)': 'Lucro Líquido Total (R$)',
+    'Margem de Lucro (%)': 'Margem de Lucro (%)',
+    'Margem Líquida Inicial (%)': 'Margem Líquida Inicial (%)',
+    'Volume Total Ocupado (m³)': 'Volume Total Ocupado (m³)',
+}
+
+
+# Padrões de "UNIDADE/EMBALAGEM", em ordem de prioridade, e se cada um traz o peso por unidade
+UNIDADE_EMBALAGEM_PATTERNS = [
+    # "12,00 unidades de 0,5 kg"
+    (re.compile(r'^(\d+)(?:,\d+)?\s*unidades?\s*de\s*([\d,.]+)\s*kg', re.IGNORECASE), True),
+    # "12 x 0,5kg"
+    (re.compile(r'^(\d+)(?:,\d+)?\s*[x×]\s*([\d,.]+)\s*kg', re.IGNORECASE), True),
+    # "caixa 24un 1kg", "fardo 6 und. de 2,5 kg", "12,00 unid de 0,5kg". A quantidade começa num
+    # número inteiro (não no meio de "12,00" ou "1.000") e pode ter casas decimais
+    (re.compile(r'(?<![\d,.])(\d+)(?:,\d+)?\s*(?:un|und|unid|unidades?)\b\.?\s*(?:de\s*|x\s*)?([\d,.]+)\s*kg', re.IGNORECASE), True),
+    # "X,00": embalagem simples, sem peso especificado
+    (re.compile(r'^(\d+),\d+'), False),
+]
+
+# Resultados já calculados por texto distinto; os textos se repetem muito entre fornecedores
+_parse_cache = {}
+_PARSE_CACHE_MAX = 100_000
+
+
+# Converter números no formato brasileiro ("1.000,5" ou "0,5") para float
+def parse_decimal(values):
+    values = values.astype(str)
+    has_comma = values.str.contains(',', regex=False)
+    values = values.where(~has_comma, values.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(values, errors='coerce')
+
+
+# Interpretar uma lista de textos distintos com str.extract, padrão a padrão
+def _parse_distinct(texts):
+    unidades = pd.Series(1, index=texts.index, dtype='int64')
+    peso_unidade = pd.Series(0.0, index=texts.index)
+    pending = texts
+    for pattern, has_weight in UNIDADE_EMBALAGEM_PATTERNS:
+        if pending.empty:
+            break
+        found = pending.str.extract(pattern).dropna(subset=[0])
+        if has_weight:
+            peso = parse_decimal(found[1])
+            # Peso ilegível: mantém o valor padrão (1 unidade, sem peso)
+            valid = peso.notna()
+            unidades[found.index[valid]] = found.loc[valid, 0].astype('int64')
+            peso_unidade[found.index[valid]] = peso[valid]
+        else:
+            unidades[found.index] = found[0].astype('int64')
+        pending = pending.drop(found.index)
+    return dict(zip(texts, zip(unidades.tolist(), peso_unidade.tolist())))
+
+
+# Extrair "Unidades por Embalagem" e "Peso por Unidade (kg)" da coluna "UNIDADE/EMBALAGEM"
+def parse_unidade_embalagem(series):
+    codes, uniques = pd.factorize(series)
+    uniques = [str(value) for value in uniques]
+    # O cache é compartilhado entre as sessões (threads) e pode ser limpo por outra a qualquer
+    # momento: os resultados desta chamada ficam num dict local, e o cache só é consultado com get
+    found = {}
+    for text in uniques:
+        value = _parse_cache.get(text)
+        if value is not None:
+            found[text] = value
+    missing = [text for text in uniques if text not in found]
+    if missing:
+        parsed_missing = _parse_distinct(pd.Series(missing, dtype=object))
+        found.update(parsed_missing)
+        if len(_parse_cache) + len(parsed_missing) > _PARSE_CACHE_MAX:
+            _parse_cache.clear()
+        _parse_cache.update(parsed_missing)
+
+    # A última posição atende os valores ausentes (código -1 do factorize)
+    parsed = [found[text] for text in uniques] + [(1, 0.0)]
+    unidades = np.fromiter((item[0] for item in parsed), dtype=np.int64, count=len(parsed))
+    peso_unidade = np.fromiter((item[1] for item in parsed), dtype=float, count=len(parsed))
+    return pd.DataFrame({
+        'Unidades por Embalagem': unidades[codes],
+        'Peso por Unidade (kg)': peso_unidade[codes],
+    }, index=series.index)
+
+
+# Divisão elemento a elemento que devolve 0.0 onde o denominador é zero
+def safe_divide(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+# Rótulo "Fornecedor (Marca)" usado nas tabelas e gráficos
+def supplier_labels(df):
+    return df['FORNECEDOR'].astype(str) + ' (' + df['MARCA'].astype(str) + ')'
+
+
+# Calcular todas as colunas derivadas da margem com operações vetorizadas por coluna
+def compute_margin_columns(df):
+    # Cópia rasa: só colunas novas ou substituídas ocupam memória; as demais continuam
+    # compartilhadas com o DataFrame recebido, que não é alterado
+    df = df.copy(deep=False)
+
+    # Garantir que as colunas sejam numéricas e lidar com valores nulos
+    for col in INPUT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+
+    # Calcular o peso total por embalagem a partir da coluna "UNIDADE/EMBALAGEM"
+    embalagem = parse_unidade_embalagem(df['UNIDADE/EMBALAGEM'])
+    df['Unidades por Embalagem'] = embalagem['Unidades por Embalagem']
+    df['Peso por Unidade (kg)'] = embalagem['Peso por Unidade (kg)']
+
+    # Se Peso por Unidade for 0, usar KG da Unidade; caso contrário, Unidades por Embalagem × Peso por Unidade
+    unidades = df['Unidades por Embalagem'].to_numpy(dtype=float)
+    peso_unidade = df['Peso por Unidade (kg)'].to_numpy()
+    df['Peso Total por Embalagem (kg)'] = unidades * np.where(peso_unidade == 0.0, df['KG da Unidade'].to_numpy(), peso_unidade)
+
+    df['Peso Total (kg)'] = df['QUANTIDADE MÍNIMA (Embalagens)'] * df['Peso Total por Embalagem (kg)']
+    df['Custo Total (R$)'] = df['Logística (R$)'] + df['Impostos (R$)'] + df['Aduaneiros (R$)'] + df['Outros Custos (R$)']
+    df['Custo Total por kg (R$/kg)'] = safe_divide(df['Custo Total (R$)'], df['Peso Total (kg)'])
+    df['Lucro Bruto por kg (R$/kg)'] = df['PREÇO DE VENDA'] - df['MÉDIA/KG']
+    df['Lucro Líquido por kg (R$/kg)'] = df['Lucro Bruto por kg (R$/kg)'] - df['Custo Total por kg (R$/kg)']
+    df['Margem de Lucro (%)'] = safe_divide(df['Lucro Líquido por kg (R$/kg)'], df['MÉDIA/KG']) * 100
+    df['Valor Total da Venda (R$)'] = df['PREÇO DE VENDA'] * df['Peso Total (kg)']
+    df['Lucro Bruto Total (R$)'] = df['Lucro Bruto por kg (R$/kg)'] * df['Peso Total (kg)']
+    df['Lucro Líquido Total (R$)'] = df['Lucro Líquido por kg (R$/kg)'] * df['Peso Total (kg)']
+    df['Margem Líquida Inicial (%)'] = safe_divide(df['Lucro Líquido Total (R$)'], df['Valor Total da Venda (R$)']) * 100
+    df['Volume Total Ocupado (m³)'] = df['QUANTIDADE MÍNIMA (Embalagens)'] * df['Volume/m³']
+    if DERIVED_FLOAT_DTYPE != 'float64':
+        float_columns = [col for col in DERIVED_COLUMNS if col != 'Unidades por Embalagem']
+        df[float_columns] = df[float_columns].astype(DERIVED_FLOAT_DTYPE)
+    return df
+
+
+# Montar a tabela "Margem de Lucro" a partir das colunas derivadas
+def build_margin_table(df):
+    table = pd.DataFrame({'Fornecedor (Marca)': supplier_labels(df)})
+    for table_column, source_column in MARGIN_TABLE_COLUMNS.items():
+        table[table_column] = df[source_column].round(0 if table_column == 'Quantidade Mínima (Embalagens)' else 2)
+    return table.reset_index(drop=True)
+
+
+# Motor de margem: devolve o DataFrame com as colunas derivadas e a tabela de exibição
+def compute_margins(df):
+    derived = compute_margin_columns(df)
+    return derived, build_margin_table(derived)
+
+
+# Custo do dinheiro acumulado (em pontos percentuais de margem) após cada mês de estoque.
+# "linear" reproduz o decréscimo de taxa_juros_mensal * (mes - 1); "compound" capitaliza a
+# taxa mensal equivalente à anual, de forma que 12 meses de juros somem a taxa anual
+def holding_cost(meses, taxa_juros_anual, modo='linear'):
+    meses = np.asarray(meses, dtype=float)
+    if modo == 'linear':
+        return (taxa_juros_anual / 12.0) * (meses - 1)
+    if modo == 'compound':
+        taxa_mensal = (1 + taxa_juros_anual / 100.0) ** (1 / 12.0) - 1
+        return ((1 + taxa_mensal) ** (meses - 1) - 1) * 100.0
+    raise ValueError(f"Modo de juros desconhecido: {modo}")
+
+
+# Matriz fornecedores × meses da margem líquida ajustada, limitada a zero.
+# Fornecedores sem margem inicial (0.0) ficam com NaN ("Não Calculável")
+def holding_cost_matrix(margens_iniciais, meses, taxa_juros_anual, modo='linear'):
+    margens = np.asarray(margens_iniciais, dtype=float)
+    ajustada = np.clip(margens[:, None] - holding_cost(meses, taxa_juros_anual, modo)[None, :], 0, None)
+    ajustada[margens == 0.0] = np.nan
+    return ajustada
+
+
+# Superfícies de equilíbrio do cubo fornecedores × meses × taxas: a maior taxa viável por
+# fornecedor e mês (NaN se nenhuma) e o maior tempo de estoque viável por fornecedor e taxa
+# (0 se nenhum). A regra (margem ajustada > taxa) só melhora com a margem inicial, então cada
+# célula meses × taxas tem uma margem de corte: com os fornecedores ordenados por margem, uma
+# busca binária vetorizada sobre todas as células acha o primeiro viável, sem montar o cubo
+def scenario_surfaces(margens_iniciais, meses, taxas_juros, modo='linear'):
+    margens = np.asarray(margens_iniciais, dtype=float)
+    meses = np.asarray(meses)
+    taxas = np.asarray(taxas_juros, dtype=float)
+    custo = holding_cost(meses[:, None], taxas[None, :], modo)  # meses × taxas
+    n = len(margens)
+
+    ordenadas = np.where(np.isnan(margens), -np.inf, margens)  # NaN: excluídos pela máscara abaixo
+    ordem = np.argsort(ordenadas, kind='stable')
+    ordenadas = ordenadas[ordem]
+    inicio, fim = np.zeros(custo.shape, dtype=np.int64), np.full(custo.shape, n, dtype=np.int64)
+    while (inicio < fim).any():
+        meio = (inicio + fim) // 2
+        viavel = np.maximum(ordenadas[np.minimum(meio, n - 1)] - custo, 0) > taxas
+        ativo = inicio < fim
+        fim = np.where(ativo & viavel, meio, fim)
+        inicio = np.where(ativo & ~viavel, meio + 1, inicio)
+
+    # Da posição de corte em diante, a célula é viável: máximo acumulado ao longo das posições
+    colunas_taxa = np.broadcast_to(np.arange(len(taxas)), custo.shape)
+    tempo_maximo = np.zeros((n + 1, len(taxas)), dtype=meses.dtype)
+    np.maximum.at(tempo_maximo, (inicio, colunas_taxa), np.broadcast_to(meses[:, None], custo.shape))
+    colunas_mes = np.broadcast_to(np.arange(len(meses))[:, None], custo.shape)
+    taxa_equilibrio = np.full((n + 1, len(meses)), -np.inf)
+    np.maximum.at(taxa_equilibrio, (inicio, colunas_mes), np.broadcast_to(taxas, custo.shape))
+
+    excluidos = np.isnan(margens) | (margens == 0.0)
+    tempo_maximo = np.maximum.accumulate(tempo_maximo, axis=0)[:n][np.argsort(ordem)]
+    tempo_maximo[excluidos] = 0
+    taxa_equilibrio = np.maximum.accumulate(taxa_equilibrio, axis=0)[:n][np.argsort(ordem)]
+    taxa_equilibrio[~np.isfinite(taxa_equilibrio)] = np.nan
+    taxa_equilibrio[excluidos] = np.nan
+    return taxa_equilibrio, tempo_maximo
+
+
+# Resumo por fornecedor das superfícies de equilíbrio no tempo de estoque e na taxa escolhidos
+def build_scenario_table(df, taxa_equilibrio, tempo_maximo, indice_tempo, indice_taxa):
+    margem_inicial = df['Margem Líquida Inicial (%)'].to_numpy(dtype=float)
+    return pd.DataFrame({
+        'Fornecedor (Marca)': supplier_labels(df).to_numpy(),
+        'Margem Líquida Inicial (%)': margem_inicial.round(2),
+        'Taxa de Equilíbrio (%)': taxa_equilibrio[:, indice_tempo],
+        'Tempo Máximo Viável (Meses)': tempo_maximo[:, indice_taxa],
+    })
+
+
+# Montar a tabela "Margem Líquida por Fornecedor" para um tempo de estoque (coluna da matriz)
+def build_holding_table(df, margem_ajustada, taxa_juros_anual):
+    margem_inicial = df['Margem Líquida Inicial (%)'].to_numpy(dtype=float)
+    calculavel = ~np.isnan(margem_ajustada)
+    viavel = calculavel & (np.nan_to_num(margem_ajustada) > taxa_juros_anual)
+    return pd.DataFrame({
+        'Fornecedor (Marca)': supplier_labels(df).to_numpy(),
+        'Investimento Inicial (R$)': (df['VALOR/EMBALAGEM'] * df['QUANTIDADE MÍNIMA (Embalagens)'] + df['Custo Total (R$)']).round(2).to_numpy(),
+        'Valor Total da Venda (R$)': df['Valor Total da Venda (R$)'].round(2).to_numpy(),
+        'Margem Líquida Inicial (%)': np.where(margem_inicial != 0.0, margem_inicial.round(2).astype(str), 'Não Calculável'),
+        'Margem Líquida Ajustada (%)': np.where(calculavel, np.round(margem_ajustada, 2).astype(str), 'Não Calculável'),
+        'Taxa de Juros Anual (%)': taxa_juros_anual,
+        'Viável': np.where(viavel, 'Sim', 'Não'),
+    })
+
+
+# Colunas lidas por compute_margin_columns; só as de INPUT_COLUMNS e DERIVED_COLUMNS mudam
+PATCH_SOURCE_COLUMNS = INPUT_COLUMNS + ['UNIDADE/EMBALAGEM']
+
+
+# Linhas `ids` recalculadas sobre o resultado compartilhado `base_derived` (o conjunto sem
+# entradas, calculado uma vez por versão dos dados), com as entradas da camada `overlay` (ver
+# inputs.new_overlay). Devolve as colunas de entrada e derivadas dessas linhas, indexadas pelo id
+def compute_margin_patch(base_derived, overlay, ids):
+    from inputs import apply_overlay  # inputs importa margins
+
+    source = apply_overlay(base_derived.loc[ids, PATCH_SOURCE_COLUMNS], overlay)
+    return compute_margin_columns(source)[INPUT_COLUMNS + DERIVED_COLUMNS]
+
+
+# Motor de margem incremental de uma sessão. `state` (ex.: um dict em st.session_state) guarda só
+# as linhas com entradas já recalculadas e a revisão da camada em que foram calculadas: na
+# primeira execução com uma camada (uma por versão dos dados) todas as linhas com entradas são
+# calculadas; depois, só as editadas desde essa revisão. Sem edições novas (filtros e controles
+# de estoque/juros), nada é percorrido nem recalculado
+def update_margin_patch(state, base_derived, overlay):
+    from inputs import overlay_row_ids  # inputs importa margins
+
+    start = time.perf_counter()
+    if state.get('overlay') is not overlay:
+        ids = overlay_row_ids(overlay)
+        patch = compute_margin_patch(base_derived, overlay, ids)
+    elif state['revision'] != overlay['revision']:
+        ids = overlay_row_ids(overlay, since=state['revision'])
+        patch = pd.concat([state['patch'].drop(ids, errors='ignore'), compute_margin_patch(base_derived, overlay, ids)])
+    else:
+        ids, patch = [], state['patch']
+    state.update(
+        overlay=overlay, revision=overlay['revision'], patch=patch,
+        rows_recomputed=len(ids), elapsed_ms=(time.perf_counter() - start) * 1000,
+    )
+    return patch
+
+
+# Copiar uma coluna trocando os valores das posições `at`
+def _replace_values(column, at, values):
+    replaced = column.to_numpy(copy=True)
+    replaced[at] = values
+    return replaced
+
+
+# Resultado de uma sessão nas linhas `positions` do conjunto (None = todas): as colunas derivadas
+# e a tabela de margem compartilhadas, com as linhas de `patch` (update_margin_patch) por cima.
+# Só as colunas em que essas linhas mudam são copiadas, e nada é copiado sem entradas
+def combine_margins(base_derived, base_table, patch, positions=None):
+    derived = base_derived if positions is None else base_derived.iloc[positions]
+    table = base_table if positions is None else base_table.iloc[positions].reset_index(drop=True)
+    at = derived.index.get_indexer(patch.index) if len(patch) else np.array([], dtype=np.int64)
+    found = at >= 0  # Linhas fora do filtro ficam de fora
+    if not found.any():
+        return derived, table
+    at, patch = at[found], patch[found]
+
+    def replaced(frame, columns):
+        new_columns = {}
+        for column, values in columns:
+            if not np.array_equal(frame[column].to_numpy()[at], values, equal_nan=True):
+                new_columns[column] = _replace_values(frame[column], at, values)
+        return frame.assign(**new_columns) if new_columns else frame
+
+    derived = replaced(derived, ((col, patch[col].to_numpy()) for col in patch.columns))
+    table = replaced(table, (
+        (table_column, patch[source_column].round(0 if table_column == 'Quantidade Mínima (Embalagens)' else 2).to_numpy())
+        for table_column, source_column in MARGIN_TABLE_COLUMNS.items()
+    ))
+    return derived, table
+
+
+# Relatório de viabilidade em formato longo, um cenário (tempo de estoque × taxa de juros) por
+# vez: cada DataFrame gerado tem uma linha por fornecedor, com números (NaN quando não calculável)
+def iter_viability_report(derived, tempos_estoque, taxas_juros, modo='linear'):
+    base = build_margin_table(derived)
+    base.insert(0, 'PRODUTO', derived['PRODUTO'].astype(str).to_numpy())
+    base.insert(2, 'Investimento Inicial (R$)', (derived['VALOR/EMBALAGEM'] * derived['QUANTIDADE MÍNIMA (Embalagens)'] + derived['Custo Total (R$)']).round(2).to_numpy())
+    margens = derived['Margem Líquida Inicial (%)'].to_numpy(dtype=float)
+    tempos_estoque = np.asarray(tempos_estoque, dtype=np.int64)
+    for taxa in taxas_juros:
+        ajustada = holding_cost_matrix(margens, tempos_estoque, taxa, modo)
+        for j, tempo in enumerate(tempos_estoque):
+            yield base.assign(**{
+                'Tempo de Estoque (Meses)': tempo,
+                'Taxa de Juros Anual (%)': float(taxa),
+                'Margem Líquida Ajustada (%)': ajustada[:, j].round(2),
+                'Viável': np.where(ajustada[:, j] > taxa, 'Sim', 'Não'),
+            })
+
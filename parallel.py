@@ -0,0 +1,124 @@
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pyarrow as pa
+
+from margins import DERIVED_COLUMNS, INPUT_COLUMNS, build_margin_table, compute_margin_columns, compute_margins, holding_cost_matrix
+
+# Backend opcional de cálculo em vários processos para planilhas muito grandes: o conjunto já
+# limpo é dividido em blocos de linhas e a limpeza numérica, a margem e o custo de estoque de
+# cada bloco rodam num pool de processos. A entrada vai uma única vez para a memória
+# compartilhada como um stream Arrow (cada processo lê só a fatia do seu bloco, sem cópia nem
+# pickle) e cada processo escreve os resultados na sua faixa de linhas de uma matriz também
+# compartilhada, então a ordem original sai pronta e os números são os mesmos do cálculo num
+# processo só. DASHBOARD_WORKERS > 1 liga o backend no dashboard
+
+WORKERS = int(os.environ.get('DASHBOARD_WORKERS', '0'))
+
+# Abaixo deste número de linhas, um processo só é mais rápido que o vaivém com o pool
+MIN_ROWS = 200_000
+
+# Tamanho mínimo de um bloco; cada processo recebe alguns blocos para equilibrar a carga
+MIN_CHUNK_ROWS = 50_000
+CHUNKS_PER_WORKER = 4
+
+# Colunas lidas pelo motor de margem e colunas numéricas que ele devolve
+SOURCE_COLUMNS = INPUT_COLUMNS + ['UNIDADE/EMBALAGEM']
+RESULT_COLUMNS = INPUT_COLUMNS + DERIVED_COLUMNS
+
+
+# Trabalho de um processo: linhas [start, stop) da entrada, resultados na mesma faixa da saída.
+# Devolve o tipo de cada coluna calculada, para a remontagem no tipo original
+def _compute_chunk(input_name, output_name, n_rows, start, stop, meses, taxa_juros_anual, modo):
+    # Os processos do pool usam o mesmo resource_tracker de quem os criou: o registro feito ao
+    # abrir o bloco aqui é o mesmo do criador, que o desfaz ao remover o bloco
+    shm_in, shm_out = shared_memory.SharedMemory(name=input_name), shared_memory.SharedMemory(name=output_name)
+    try:
+        return _write_chunk(shm_in.buf, shm_out.buf, n_rows, start, stop, meses, taxa_juros_anual, modo)
+    finally:
+        # As colunas lidas sem cópia apontam para o bloco; só depois do retorno acima (que as
+        # descarta) o bloco pode ser fechado
+        shm_in.close()
+        shm_out.close()
+
+
+def _write_chunk(input_buffer, output_buffer, n_rows, start, stop, meses, taxa_juros_anual, modo):
+    table = pa.ipc.open_stream(pa.py_buffer(input_buffer)).read_all()
+    derived = compute_margin_columns(table.slice(start, stop - start).to_pandas())
+    n_outputs = len(RESULT_COLUMNS) + (len(meses) if meses is not None else 0)
+    output = np.ndarray((n_outputs, n_rows), dtype=np.float64, buffer=output_buffer)
+    for i, col in enumerate(RESULT_COLUMNS):
+        output[i, start:stop] = derived[col].to_numpy(dtype=np.float64)
+    if meses is not None:
+        matriz = holding_cost_matrix(derived['Margem Líquida Inicial (%)'], meses, taxa_juros_anual, modo)
+        output[len(RESULT_COLUMNS):, start:stop] = matriz.T
+    return {col: str(derived[col].dtype) for col in RESULT_COLUMNS}
+
+
+# Limites [início, fim) dos blocos de linhas para um número de processos
+def chunk_bounds(n_rows, workers, min_chunk_rows=MIN_CHUNK_ROWS):
+    n_chunks = max(1, min(workers * CHUNKS_PER_WORKER, n_rows // min_chunk_rows))
+    edges = np.linspace(0, n_rows, n_chunks + 1).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+class ComputePool:
+    def __init__(self, workers, min_rows=MIN_ROWS, min_chunk_rows=MIN_CHUNK_ROWS):
+        self.workers = workers
+        self.min_rows = min_rows
+        self.min_chunk_rows = min_chunk_rows
+        # spawn: o processo do Streamlit tem threads, e fork copiaria locks em uso
+        self._executor = ProcessPoolExecutor(workers, mp_context=get_context('spawn'))
+        atexit.register(self.close)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    # Mesma saída de margins.compute_margins (e, com `meses`, de holding_cost_matrix sobre a
+    # margem líquida inicial): (derivado, tabela, matriz ou None)
+    def compute(self, df, meses=None, taxa_juros_anual=0.0, modo='linear'):
+        if len(df) < self.min_rows:
+            derived, table = compute_margins(df)
+            matriz = None if meses is None else holding_cost_matrix(derived['Margem Líquida Inicial (%)'], meses, taxa_juros_anual, modo)
+            return derived, table, matriz
+
+        n_rows = len(df)
+        meses = None if meses is None else np.asarray(meses)
+        table = pa.Table.from_pandas(df[SOURCE_COLUMNS], preserve_index=False)
+        sink = pa.MockOutputStream()  # Só mede o tamanho do stream
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        n_outputs = len(RESULT_COLUMNS) + (len(meses) if meses is not None else 0)
+        shm_in = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+        shm_out = shared_memory.SharedMemory(create=True, size=max(n_outputs * n_rows * 8, 1))
+        try:
+            buffer = pa.py_buffer(shm_in.buf)
+            with pa.ipc.new_stream(pa.FixedSizeBufferWriter(buffer), table.schema) as writer:
+                writer.write_table(table)
+            del table, writer, buffer  # Sem referências ao bloco, ele pode ser fechado
+            futures = [
+                self._executor.submit(_compute_chunk, shm_in.name, shm_out.name, n_rows, start, stop, meses, taxa_juros_anual, modo)
+                for start, stop in chunk_bounds(n_rows, self.workers, self.min_chunk_rows)
+            ]
+            dtypes = [future.result() for future in futures][0]
+
+            output = np.ndarray((n_outputs, n_rows), dtype=np.float64, buffer=shm_out.buf)
+            derived = df.copy(deep=False)
+            for i, col in enumerate(RESULT_COLUMNS):
+                derived[col] = output[i].astype(dtypes[col])
+            matriz = None if meses is None else output[len(RESULT_COLUMNS):].T.copy()
+            del output
+        finally:
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
+        return derived, build_margin_table(derived), matriz
+
+    # Substituto de margins.compute_margins (ex.: nas margens compartilhadas do dashboard)
+    def compute_margins(self, df):
+        derived, table, _ = self.compute(df)
+        return derived, table
@@ -0,0 +1,108 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+# Medição por etapa do pipeline (busca, decodificação, parse, limpeza, margem, custo de estoque,
+# tabelas, gráficos e renderização): tempo, linhas e variação de memória de cada etapa.
+#
+#   with stage('parse') as etapa:
+#       df = read_supplier_csv(stream)
+#       etapa['rows'] = len(df)
+#
+# Fora de uma execução medida (start_run), stage() devolve sempre o mesmo contexto vazio, sem
+# relógio nem leitura de memória. DASHBOARD_PROFILE=1 liga a medição por padrão e
+# DASHBOARD_METRICS_FILE grava cada execução medida como uma linha JSON nesse arquivo
+
+ENABLED = os.environ.get('DASHBOARD_PROFILE') == '1'
+METRICS_FILE = os.environ.get('DASHBOARD_METRICS_FILE')
+
+logger = logging.getLogger('dashboard.profiling')
+
+# Execução medida do contexto atual (cada sessão do Streamlit roda no seu próprio contexto)
+_current_run = contextvars.ContextVar('dashboard_profiling_run', default=None)
+_metrics_lock = threading.Lock()
+
+
+# Memória residente do processo em bytes (/proc no Linux; pico de memória nos demais sistemas)
+def memory_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Contexto vazio usado quando não há execução medida; o dict aceita 'rows' e é descartado
+class _NullStage:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, run, name, rows):
+        self.run = run
+        self.record = {'stage': name, 'rows': rows, 'thread': threading.current_thread().name}
+
+    def __enter__(self):
+        self.memory = memory_bytes()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, *exc):
+        self.record['ms'] = (time.perf_counter() - self.start) * 1000
+        self.record['memory_delta_mb'] = (memory_bytes() - self.memory) / 2**20
+        if exc_type is not None:
+            self.record['error'] = exc_type.__name__
+        self.run['stages'].append(self.record)
+        return False
+
+
+# Medir uma etapa da execução atual; `rows` pode ser informado aqui ou no dict devolvido
+def stage(name, rows=None):
+    run = _current_run.get()
+    if run is None:
+        return _NULL_STAGE
+    return _Stage(run, name, rows)
+
+
+# Iniciar uma execução medida no contexto atual (ex.: um rerun do dashboard)
+def start_run(label='rerun'):
+    run = {'label': label, 'started_at': time.time(), 'stages': [], '_start': time.perf_counter()}
+    _current_run.set(run)
+    return run
+
+
+# Encerrar a execução atual: total, registro no log e, se configurado, no arquivo de métricas.
+# Devolve a execução (None se nenhuma estava sendo medida)
+def finish_run(metrics_file=None):
+    run = _current_run.get()
+    if run is None:
+        return None
+    _current_run.set(None)
+    run['total_ms'] = (time.perf_counter() - run.pop('_start')) * 1000
+    logger.info(json.dumps(run, ensure_ascii=False))
+    metrics_file = metrics_file or METRICS_FILE
+    if metrics_file:
+        with _metrics_lock, open(metrics_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+    return run
+
+
+# Somar as etapas de uma execução por nome: [(etapa, chamadas, ms, linhas, memória em MiB)]
+def summarize(run):
+    totals = {}
+    for record in run['stages']:
+        calls, ms, rows, memory = totals.get(record['stage'], (0, 0.0, 0, 0.0))
+        totals[record['stage']] = (calls + 1, ms + record['ms'], rows + (record['rows'] or 0), memory + record['memory_delta_mb'])
+    return [(name, *values) for name, values in totals.items()]
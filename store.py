@@ -0,0 +1,155 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from inputs import EDITABLE_COLUMNS
+from loader import SNAPSHOT_DIR
+
+# Entradas dos analistas (preço de venda, quantidade, custos e volume) gravadas num SQLite local,
+# por uma chave estável de cada linha da planilha: fonte, fornecedor, produto e marca, mais a
+# ocorrência entre linhas repetidas com a mesma chave (na ordem da planilha). Assim as entradas
+# sobrevivem a recargas e a linhas acrescentadas, removidas ou reordenadas na planilha.
+#
+# As gravações são agrupadas: put() só acumula as alterações, e uma thread as grava numa única
+# transação depois de `debounce` segundos sem novas alterações (ou quando acumulam demais)
+
+INPUTS_FILE = os.environ.get('DASHBOARD_INPUTS_FILE', os.path.join(SNAPSHOT_DIR, 'entradas.sqlite'))
+
+# Colunas da chave estável de uma linha (além da ocorrência)
+KEY_COLUMNS = ['FONTE', 'FORNECEDOR', 'PRODUTO', 'MARCA']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entradas (
+    fonte TEXT NOT NULL, fornecedor TEXT NOT NULL, produto TEXT NOT NULL, marca TEXT NOT NULL,
+    ocorrencia INTEGER NOT NULL, coluna TEXT NOT NULL, valor REAL, atualizado_em REAL NOT NULL,
+    PRIMARY KEY (fonte, fornecedor, produto, marca, ocorrencia, coluna)
+)
+"""
+
+_UPSERT = """
+INSERT INTO entradas (fonte, fornecedor, produto, marca, ocorrencia, coluna, valor, atualizado_em)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (fonte, fornecedor, produto, marca, ocorrencia, coluna)
+DO UPDATE SET valor = excluded.valor, atualizado_em = excluded.atualizado_em
+"""
+
+# Nomes das colunas da chave na tabela, na mesma ordem de KEY_COLUMNS + ocorrência
+_KEY_FIELDS = ['fonte', 'fornecedor', 'produto', 'marca', 'ocorrencia']
+
+
+# Chave estável de cada linha de um conjunto de fornecedores (mesmo índice do conjunto).
+# Montada uma vez por versão dos dados
+def row_keys(df):
+    keys = pd.DataFrame(index=df.index)
+    for field, col in zip(_KEY_FIELDS, KEY_COLUMNS):
+        values = df[col] if col in df.columns else pd.Series('', index=df.index)
+        keys[field] = values.astype(object).where(values.notna(), '').astype(str)
+    keys['ocorrencia'] = keys.groupby(_KEY_FIELDS[:-1], sort=False).cumcount()
+    return keys
+
+
+class InputStore:
+    def __init__(self, path=INPUTS_FILE, debounce=2.0, max_pending=5000):
+        self.path = path
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.transactions = 0  # Transações gravadas, para acompanhar o agrupamento
+        self._pending = {}  # (chave..., coluna) -> valor
+        self._writing = {}  # Lote sendo gravado; ainda visível para load()
+        self._last_put = 0.0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()  # Lotes gravados na ordem em que foram tirados
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(_SCHEMA)
+        self._thread = threading.Thread(target=self._run, name='input-store', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Acumular alterações {id da linha: {coluna: valor}} das linhas de `keys` (row_keys); None
+    # (valor apagado no editor) também é gravado, para prevalecer sobre o valor da planilha
+    def put(self, keys, changes):
+        if not changes:
+            return
+        rows = keys.loc[list(changes), _KEY_FIELDS].itertuples(index=False, name=None)
+        with self._changed:
+            for key, values in zip(rows, changes.values()):
+                for col, value in values.items():
+                    if col in EDITABLE_COLUMNS:
+                        self._pending[(*key, col)] = None if value is None or pd.isna(value) else float(value)
+            self._last_put = time.monotonic()
+            self._changed.notify()
+
+    # Gravar agora o que estiver pendente. O lote passa de `_pending` para `_writing` sob o mesmo
+    # lock, para que load() sempre o encontre num dos dois ou já gravado
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+            self._write(batch)
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        self._thread.join()
+        self.flush()
+
+    def _write(self, batch):
+        try:
+            if batch:
+                now = time.time()
+                with self._connect() as connection:
+                    connection.executemany(_UPSERT, [(*key, value, now) for key, value in batch.items()])
+                self.transactions += 1
+        finally:
+            with self._lock:
+                self._writing = {}
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._pending and not self._closed:
+                    self._changed.wait()
+                if self._closed:
+                    return
+                # Esperar `debounce` segundos sem alterações novas antes de gravar o lote
+                while not self._closed and len(self._pending) < self.max_pending:
+                    remaining = self._last_put + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+            self.flush()
+
+    # Entradas gravadas (e pendentes) das linhas de `keys`, juntadas às linhas num único merge:
+    # {coluna: (ids das linhas, valores)}, no formato de new_overlay(base=...). As pendentes são
+    # lidas antes do SQLite: um lote gravado entre as duas leituras aparece no SQLite, e um lote
+    # ainda não gravado está nas pendentes
+    def load(self, keys):
+        with self._lock:
+            recent = {**self._writing, **self._pending}
+        with self._connect() as connection:
+            stored = pd.read_sql_query(f"SELECT {', '.join(_KEY_FIELDS)}, coluna, valor FROM entradas", connection)
+        if recent:
+            recent = pd.DataFrame([(*key, value) for key, value in recent.items()], columns=stored.columns)
+            stored = pd.concat([stored, recent], ignore_index=True).drop_duplicates(_KEY_FIELDS + ['coluna'], keep='last')
+        if stored.empty:
+            return {}
+        stored['ocorrencia'] = stored['ocorrencia'].astype(np.int64)
+        rows = keys.rename_axis('_linha').reset_index()
+        merged = rows.merge(stored, on=_KEY_FIELDS, how='inner')
+        return {
+            col: (group['_linha'].to_numpy(), group['valor'].to_numpy(dtype=float))
+            for col, group in merged.groupby('coluna', sort=False) if col in EDITABLE_COLUMNS
+        }
@@ -0,0 +1,158 @@
+import contextlib
+import hashlib
+import http.server
+import io
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from loader import GID_FORNECEDOR, SPREADSHEET_ID, clean_supplier_frame, read_supplier_csv
+from margins import COST_COLUMNS
+
+# Planilhas sintéticas e o servidor local que faz as vezes do Google Sheets, usados pelos testes
+# (tests/) e pelos benchmarks (benchmark.py)
+
+
+# Gerar uma planilha FORNECEDOR2 sintética no formato exportado pelo Google Sheets
+def make_sheet_csv(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    produtos = np.array([f'Produto {i}' for i in range(50)])
+    fornecedores = np.array([f'Fornecedor {i}' for i in range(200)])
+    embalagens = np.array(['1,00', '12,00 unidades de 0,5 kg', '24,00 unidades de 1 kg', '6,00 unidades de 2,5 kg'])
+    valor = rng.uniform(1, 5000, n_rows).round(2)
+    df = pd.DataFrame({
+        'PRODUTO': produtos[rng.integers(0, len(produtos), n_rows)],
+        'FORNECEDOR': fornecedores[rng.integers(0, len(fornecedores), n_rows)],
+        'MARCA': 'Marca',
+        'KG da Unidade': rng.uniform(0.1, 50, n_rows).round(2),
+        'UNIDADE/EMBALAGEM': embalagens[rng.integers(0, len(embalagens), n_rows)],
+        'VALOR UNITÁRIO': valor,
+        'MÉDIA/KG': valor / 10,
+        'VALOR/EMBALAGEM': valor * 12,
+        'VALOR/TONELADA': valor * 100,
+        'PREÇO DE VENDA': '',
+        'QUANTIDADE MÍNIMA (Embalagens)': rng.integers(1, 1000, n_rows),
+        'LOCAL DE ENTREGA': 'São Paulo',
+    })
+    for col in ['VALOR UNITÁRIO', 'MÉDIA/KG', 'VALOR/EMBALAGEM', 'VALOR/TONELADA']:
+        df[col] = 'R$ ' + df[col].map('{:,.2f}'.format).str.replace(',', '_').str.replace('.', ',').str.replace('_', '.')
+    df['KG da Unidade'] = df['KG da Unidade'].map('{:.2f}'.format).str.replace('.', ',')
+    return df.to_csv(index=False).encode('utf-8')
+
+
+# Valores da planilha FORNECEDOR2 sintética "realista"
+PRODUTOS_SINTETICOS = [
+    'Açúcar Cristal', 'Açúcar VHP', 'Café Arábica Torrado', 'Café Conilon', 'Feijão Carioca', 'Feijão Preto',
+    'Arroz Parboilizado', 'Arroz Branco Tipo 1', 'Óleo de Soja', 'Farinha de Trigo', 'Milho em Grão', 'Leite em Pó Integral',
+    'Castanha de Caju', 'Cacau em Amêndoa', 'Pimenta-do-Reino', 'Algodão em Pluma',
+]
+FORNECEDORES_SINTETICOS = ['Comercial', 'Agroindústria', 'Cooperativa', 'Distribuidora', 'Cerealista', 'Exportadora']
+SOBRENOMES_SINTETICOS = ['Andrade', 'São João', 'Vale Verde', 'Boa Esperança', 'Três Irmãos', 'Paraná', 'Goiás', 'Nordeste']
+EMBALAGENS_SINTETICAS = [
+    '1,00', '12,00 unidades de 0,5 kg', '24,00 unidades de 1 kg', '6,00 unidades de 2,5 kg', '10 x 1kg', '12 X 0,5 kg',
+    'caixa 24un 1kg', 'fardo 6 und. de 5 kg', 'saco 25 kg', 'granel', '1.000,00', '',
+]
+LOCAIS_SINTETICOS = ['São Paulo - SP', 'Santos - SP', 'Paranaguá - PR', 'Itajaí - SC', 'Rio de Janeiro - RJ', 'Uberlândia - MG']
+
+
+# Formatar números como na planilha: "R$ 1.234,56" (moeda) ou "1.234,56"
+def format_brl(values, currency=True, decimals=2):
+    text = pd.Series(values).map(f'{{:,.{decimals}f}}'.format).str.replace(',', '_').str.replace('.', ',').str.replace('_', '.')
+    return ('R$ ' + text) if currency else text
+
+
+# Planilha FORNECEDOR2 sintética com a cara da real: preços "R$ 1.234,56", pesos "0,5" e
+# "1.000", embalagens em vários formatos, preços de venda só em parte das linhas, células em
+# branco (blank_ratio) e colunas a mais depois de "LOCAL DE ENTREGA" (extra_columns)
+def make_fornecedor2_csv(n_rows, seed=0, blank_ratio=0.02, extra_columns=2, n_products=400, n_suppliers=1500):
+    rng = np.random.default_rng(seed)
+    produtos = np.array([f'{PRODUTOS_SINTETICOS[i % len(PRODUTOS_SINTETICOS)]} Lote {i // len(PRODUTOS_SINTETICOS) + 1}' for i in range(n_products)])
+    fornecedores = np.array([
+        f'{FORNECEDORES_SINTETICOS[i % len(FORNECEDORES_SINTETICOS)]} {SOBRENOMES_SINTETICOS[i // len(FORNECEDORES_SINTETICOS) % len(SOBRENOMES_SINTETICOS)]} {i} Ltda'
+        for i in range(n_suppliers)
+    ])
+    kg = rng.choice([0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 1000.0], n_rows)
+    media_kg = rng.uniform(2, 80, n_rows).round(2)
+    unidades = rng.choice([1, 6, 10, 12, 24], n_rows)
+    df = pd.DataFrame({
+        'PRODUTO': produtos[rng.integers(0, n_products, n_rows)],
+        'FORNECEDOR': fornecedores[rng.integers(0, n_suppliers, n_rows)],
+        'MARCA': rng.choice(['Própria', 'Premium', 'Tradicional', 'Exportação'], n_rows),
+        'KG da Unidade': format_brl(kg, currency=False).str.replace(',00', '', regex=False),
+        'UNIDADE/EMBALAGEM': rng.choice(EMBALAGENS_SINTETICAS, n_rows),
+        'VALOR UNITÁRIO': format_brl(media_kg * kg),
+        'MÉDIA/KG': format_brl(media_kg),
+        'VALOR/EMBALAGEM': format_brl(media_kg * kg * unidades),
+        'VALOR/TONELADA': format_brl(media_kg * 1000),
+        'PREÇO DE VENDA': np.where(rng.random(n_rows) < 0.4, (media_kg * rng.uniform(0.8, 1.6, n_rows)).round(2).astype(str), ''),
+        'QUANTIDADE MÍNIMA (Embalagens)': format_brl(rng.integers(1, 5000, n_rows), currency=False, decimals=0),
+        'LOCAL DE ENTREGA': rng.choice(LOCAIS_SINTETICOS, n_rows),
+    })
+    for i in range(extra_columns):
+        df[f'OBSERVAÇÕES {i + 1}'] = np.where(rng.random(n_rows) < 0.3, 'Frete "FOB", pagamento 30/60 dias', '')
+    for col in df.columns[3:]:
+        df.loc[rng.random(n_rows) < blank_ratio, col] = ''
+    return df.to_csv(index=False).encode('utf-8')
+
+
+# Caminho da exportação CSV de uma aba no servidor local que faz as vezes do Google Sheets
+def sheet_export_path(spreadsheet_id=SPREADSHEET_ID, gid=GID_FORNECEDOR):
+    return f'/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}'
+
+
+# Planilha sintética já limpa, com preços de venda, custos e volumes preenchidos como no editor
+def make_edited_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = clean_supplier_frame(read_supplier_csv(io.BytesIO(make_sheet_csv(n_rows, seed))))
+    df['PREÇO DE VENDA'] = np.where(rng.random(n_rows) < 0.1, 0.0, df['MÉDIA/KG'] * rng.uniform(0.8, 1.6, n_rows))
+    for col in COST_COLUMNS:
+        df[col] = np.where(rng.random(n_rows) < 0.2, 0.0, rng.uniform(0, 5000, n_rows).round(2))
+    return df
+
+
+# Servidor HTTP local que simula o endpoint de exportação CSV do Google Sheets.
+# payloads pode ser alterado durante o teste; hits conta os pedidos por caminho e, com
+# etag=True, o servidor responde 304 quando o If-None-Match bate com o conteúdo atual;
+# latency (segundos) é somada a cada resposta e delays (caminho -> segundos, alterável durante
+# o teste) atrasa só alguns caminhos. Um payload inteiro é respondido como código de erro HTTP
+@contextlib.contextmanager
+def serve(payloads, etag=False, hits=None, latency=0.0, delays=None):
+    hits = {} if hits is None else hits
+    delays = {} if delays is None else delays
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            time.sleep(latency + delays.get(self.path, 0.0))
+            body = payloads.get(self.path)
+            if body is None or isinstance(body, int):
+                self.send_error(body or 404)
+                return
+            tag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if etag and self.headers.get('If-None-Match') == tag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', tag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
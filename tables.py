@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# Opções de linhas por página das tabelas paginadas
+PAGE_SIZES = [50, 100, 500, 1000]
+
+# Acima deste número de linhas, as tabelas abrem paginadas
+PAGINATE_ROWS = 1000
+
+
+# Número de páginas (ao menos uma, mesmo sem linhas)
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+# Posições das linhas em ordem crescente ou decrescente de uma coluna, estável e com vazios ao
+# fim. Colunas de texto com números ("Não Calculável" entre margens) são ordenadas pelos números
+def sort_positions(column, ascending=True):
+    values = column.to_numpy()
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        numeric = pd.to_numeric(pd.Series(values), errors='coerce')
+        if not numeric.notna().any():
+            return pd.Series(values).sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        values = numeric.to_numpy()
+    values = values.astype(float)
+    return np.argsort(values if ascending else -values, kind='stable')
+
+
+# Posições das linhas de uma página (1 = primeira), na ordem dada ou na ordem original
+def page_positions(n_rows, page, page_size, order=None):
+    start = (min(max(page, 1), page_count(n_rows, page_size)) - 1) * page_size
+    stop = min(start + page_size, n_rows)
+    return np.arange(start, stop) if order is None else order[start:stop]
+
+
+# Página de uma tabela ordenada no servidor: só as linhas da página são serializadas
+def paginate(df, page, page_size, sort_column=None, ascending=True):
+    order = sort_positions(df[sort_column], ascending) if sort_column is not None else None
+    return df.iloc[page_positions(len(df), page, page_size, order)]
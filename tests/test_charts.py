@@ -0,0 +1,62 @@
+import pytest
+
+from charts import BAR_MODES, MAX_BARS, build_margin_bar_figure
+from margins import compute_margins
+from synthetic import make_edited_frame
+
+# Tamanho serializado máximo do gráfico "Margem de Lucro por Peso", qualquer que seja o número
+# de linhas da planilha
+MAX_FIGURE_BYTES = 512_000
+
+
+@pytest.fixture(scope='module')
+def derived():
+    return compute_margins(make_edited_frame(100_000))[0]
+
+
+# Um fornecedor diferente por linha: os agrupamentos passam de MAX_BARS grupos
+@pytest.fixture(scope='module')
+def distinct_suppliers(derived):
+    return derived.assign(FORNECEDOR=[f'Fornecedor {i}' for i in range(len(derived))])
+
+
+@pytest.mark.parametrize('mode', BAR_MODES)
+def test_figure_size_is_bounded(derived, mode):
+    fig, _ = build_margin_bar_figure(derived, mode)
+    assert len(fig.to_json()) < MAX_FIGURE_BYTES
+
+
+@pytest.mark.parametrize('mode', BAR_MODES)
+def test_figure_size_is_bounded_with_distinct_suppliers(distinct_suppliers, mode):
+    fig, _ = build_margin_bar_figure(distinct_suppliers, mode)
+    assert len(fig.to_json()) < MAX_FIGURE_BYTES
+
+
+def test_detailed_switches_to_histogram(derived):
+    assert build_margin_bar_figure(derived.iloc[:100], 'Detalhado', max_bars=100)[1] == 'Detalhado'
+    assert build_margin_bar_figure(derived.iloc[:101], 'Detalhado', max_bars=100)[1] == 'Histograma'
+
+
+def test_groups_limited_to_max_bars(derived):
+    fig, mode = build_margin_bar_figure(derived, 'Por Fornecedor', max_bars=10)
+    assert mode == 'Por Fornecedor'
+    assert len(fig.data[0].x) == 10
+
+
+def test_supplier_groups_capped_at_scale(distinct_suppliers):
+    fig, mode = build_margin_bar_figure(distinct_suppliers, 'Por Fornecedor')
+    assert mode == 'Por Fornecedor'
+    assert len(fig.data[0].x) == MAX_BARS
+
+
+def test_max_bars_from_environment(monkeypatch):
+    import importlib
+
+    import charts
+
+    monkeypatch.setenv('DASHBOARD_MAX_BARS', '500')
+    try:
+        assert importlib.reload(charts).MAX_BARS == 500
+    finally:
+        monkeypatch.delenv('DASHBOARD_MAX_BARS')
+        importlib.reload(charts)
@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+import pytest
+
+import cli
+from inputs import apply_overlay, new_overlay
+from loader import clean_supplier_frame, read_supplier_csv
+from margins import compute_margin_columns, iter_viability_report
+from synthetic import make_fornecedor2_csv
+
+
+@pytest.mark.parametrize('text, cast, expected', [
+    ('1-4', int, [1, 2, 3, 4]),
+    ('3,6,12', int, [3, 6, 12]),
+    ('1-3,12', int, [1, 2, 3, 12]),
+    ('0,10.5,20', float, [0.0, 10.5, 20.0]),
+    ('10.5-12', float, [10.5, 11.5]),
+])
+def test_parse_values(text, cast, expected):
+    assert cli.parse_values(text, cast) == expected
+
+
+# Planilha lida em blocos menores que o arquivo: o relatório tem uma linha por fornecedor e
+# cenário, com os mesmos números do cálculo sobre a planilha inteira
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet'])
+def test_main_in_chunks_matches_full_frame(tmp_path, suffix):
+    payload = make_fornecedor2_csv(250)
+    entrada, saida = tmp_path / 'fornecedores.csv', tmp_path / f'viabilidade{suffix}'
+    entrada.write_bytes(payload)
+    cli.main([str(entrada), '-o', str(saida), '--tempos', '1-3', '--taxas', '0,12.5', '--chunksize', '60'])
+
+    full = clean_supplier_frame(read_supplier_csv(io.BytesIO(payload)))
+    derived = compute_margin_columns(apply_overlay(full, new_overlay(None)))
+    expected = pd.concat(list(iter_viability_report(derived, [1, 2, 3], [0.0, 12.5])), ignore_index=True)
+    # Relatório ordenado por taxa, tempo e fornecedor, como o cálculo sobre a planilha inteira
+    got = pd.read_parquet(saida) if suffix == '.parquet' else pd.read_csv(saida, keep_default_na=False, na_values=[''])
+    assert len(got) == len(full) * 3 * 2
+    got = got.sort_values(['Taxa de Juros Anual (%)', 'Tempo de Estoque (Meses)'], kind='stable', ignore_index=True)
+    numeric = expected.select_dtypes('number').columns
+    pd.testing.assert_frame_equal(got[numeric], expected[numeric], check_dtype=False)
+    assert got['Viável'].tolist() == expected['Viável'].tolist()
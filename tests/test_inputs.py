@@ -0,0 +1,37 @@
+import numpy as np
+
+from inputs import EDITABLE_COLUMNS, apply_overlay, new_overlay, overlay_row_ids, record_edits
+from synthetic import make_edited_frame
+
+
+def test_apply_overlay_without_entries_returns_shared_frame():
+    base = apply_overlay(make_edited_frame(100), new_overlay('v'))
+    assert apply_overlay(base, new_overlay('v')) is base
+
+
+def test_apply_overlay_copies_only_edited_columns():
+    base = apply_overlay(make_edited_frame(100), new_overlay('v'))
+    overlay = new_overlay('v', {'Impostos (R$)': (np.array([7]), np.array([5.0]))})
+    record_edits(overlay, base.index, {2: {'PREÇO DE VENDA': 10.0}, 4: {'Volume/m³': None}})
+    edited = apply_overlay(base, overlay)
+    assert edited.loc[2, 'PREÇO DE VENDA'] == 10.0
+    assert np.isnan(edited.loc[4, 'Volume/m³'])
+    assert edited.loc[7, 'Impostos (R$)'] == 5.0
+    for col in EDITABLE_COLUMNS:
+        shared = np.shares_memory(edited[col].to_numpy(), base[col].to_numpy())
+        assert shared == (col not in ('PREÇO DE VENDA', 'Volume/m³', 'Impostos (R$)'))
+    # Só as linhas de um filtro
+    page = apply_overlay(base.iloc[[2, 3]], overlay)
+    assert page['PREÇO DE VENDA'].tolist()[0] == 10.0
+
+
+# Ids com entradas (gravadas e da sessão) e, por revisão, só os editados depois dela
+def test_overlay_row_ids_by_revision():
+    overlay = new_overlay('v', {'PREÇO DE VENDA': (np.array([1, 2]), np.array([3.0, np.nan]))})
+    record_edits(overlay, [0, 1, 2, 3], {1: {'PREÇO DE VENDA': 4.0}})
+    assert overlay_row_ids(overlay).tolist() == [1, 2]
+    revision = overlay['revision']
+    record_edits(overlay, [0, 1, 2, 3], {1: {'PREÇO DE VENDA': 4.0}, 3: {'Volume/m³': 2.0}})
+    assert overlay_row_ids(overlay).tolist() == [1, 2, 3]
+    assert overlay_row_ids(overlay, since=revision).tolist() == [3]
+    assert overlay_row_ids(overlay, since=overlay['revision']).tolist() == []
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from loader import fetch_suppliers, invalidate_snapshot, load_suppliers, read_snapshot, write_snapshot
+from synthetic import make_sheet_csv, serve
+
+
+# Snapshot local contra o servidor de teste: leitura sem pedidos dentro de max_age, revalidação
+# sem reprocessar quando o conteúdo não mudou (304 ou mesmo hash) e novo download quando mudou
+@pytest.mark.parametrize('etag', [False, True])
+def test_snapshot_revalidation(tmp_path, etag):
+    payloads, hits = {'/sheet.csv': make_sheet_csv(200)}, {}
+    with serve(payloads, etag=etag, hits=hits) as base_url:
+        url = f'{base_url}/sheet.csv'
+        df, meta = load_suppliers(url, tmp_path)
+        pd.testing.assert_frame_equal(df, fetch_suppliers(url))
+        hits.clear()
+
+        cached, _ = load_suppliers(url, tmp_path)
+        assert not hits
+        pd.testing.assert_frame_equal(cached, df)
+
+        invalidate_snapshot(url, tmp_path)
+        _, checked = load_suppliers(url, tmp_path)
+        assert hits == {'/sheet.csv': 1}
+        assert checked['fetched_at'] == meta['fetched_at']
+
+        payloads['/sheet.csv'] = make_sheet_csv(200, seed=1)
+        invalidate_snapshot(url, tmp_path)
+        changed_df, changed = load_suppliers(url, tmp_path)
+        assert changed['sha256'] != meta['sha256']
+        pd.testing.assert_frame_equal(changed_df, fetch_suppliers(url))
+
+
+# As colunas numéricas do snapshot são lidas do arquivo mapeado, sem cópia (NaN incluído)
+def test_snapshot_numeric_columns_are_mapped(tmp_path):
+    with serve({'/sheet.csv': make_sheet_csv(20_000)}) as base_url:
+        df = fetch_suppliers(f'{base_url}/sheet.csv')
+    df.loc[df.index[::7], 'MÉDIA/KG'] = np.nan
+    write_snapshot('snapshot', df, {}, tmp_path)
+
+    allocated = pa.total_allocated_bytes()
+    read = read_snapshot('snapshot', tmp_path)
+    pd.testing.assert_frame_equal(read, df)
+    numeric = [col for col in read.columns if read[col].dtype == np.float64]
+    assert numeric
+    assert pa.total_allocated_bytes() - allocated < read[numeric].memory_usage(index=False).sum() / 10
+    assert not any(read[col].to_numpy().flags.writeable for col in numeric)
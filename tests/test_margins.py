@@ -0,0 +1,182 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import margins
+from inputs import new_overlay, record_edits
+from margins import MARGIN_TABLE_COLUMNS, combine_margins, compute_margins, parse_decimal, parse_unidade_embalagem, update_margin_patch
+from synthetic import make_edited_frame
+
+
+# Implementação anterior do parser de "UNIDADE/EMBALAGEM", chamada texto a texto via apply
+def legacy_parse_unidade_embalagem(unidade_embalagem):
+    try:
+        match = re.match(r'(\d+),\d+\s*unidades\s*de\s*([\d,.]+)\s*kg', unidade_embalagem, re.IGNORECASE)
+        if match:
+            return int(match.group(1).replace(',', '')), float(match.group(2).replace(',', '.'))
+        match_simple = re.match(r'(\d+),\d+', unidade_embalagem)
+        if match_simple:
+            return int(match_simple.group(1)), 0.0
+        return 1, 0.0
+    except:
+        return 1, 0.0
+
+
+# Implementação anterior do cálculo de margem, linha a linha com apply/iterrows
+def legacy_compute_margins(edited_df):
+    edited_df = edited_df.copy()
+    for col in ['MÉDIA/KG', 'PREÇO DE VENDA', 'QUANTIDADE MÍNIMA (Embalagens)', 'Logística (R$)', 'Impostos (R$)', 'Aduaneiros (R$)', 'Outros Custos (R$)', 'Volume/m³', 'KG da Unidade', 'VALOR/EMBALAGEM']:
+        edited_df[col] = pd.to_numeric(edited_df[col], errors='coerce').fillna(0.0)
+    edited_df['Unidades por Embalagem'], edited_df['Peso por Unidade (kg)'] = zip(*edited_df['UNIDADE/EMBALAGEM'].apply(legacy_parse_unidade_embalagem))
+
+    def calculate_peso_total_por_embalagem(row):
+        if row['Peso por Unidade (kg)'] == 0.0:
+            return row['KG da Unidade'] * row['Unidades por Embalagem']
+        else:
+            return row['Unidades por Embalagem'] * row['Peso por Unidade (kg)']
+
+    edited_df['Peso Total por Embalagem (kg)'] = edited_df.apply(calculate_peso_total_por_embalagem, axis=1)
+    edited_df['Peso Total (kg)'] = edited_df['QUANTIDADE MÍNIMA (Embalagens)'] * edited_df['Peso Total por Embalagem (kg)']
+    edited_df['Custo Total (R$)'] = edited_df['Logística (R$)'] + edited_df['Impostos (R$)'] + edited_df['Aduaneiros (R$)'] + edited_df['Outros Custos (R$)']
+    edited_df['Custo Total por kg (R$/kg)'] = edited_df.apply(lambda row: row['Custo Total (R$)'] / row['Peso Total (kg)'] if row['Peso Total (kg)'] != 0 else 0.0, axis=1)
+    edited_df['Lucro Bruto por kg (R$/kg)'] = edited_df['PREÇO DE VENDA'] - edited_df['MÉDIA/KG']
+    edited_df['Lucro Líquido por kg (R$/kg)'] = edited_df['Lucro Bruto por kg (R$/kg)'] - edited_df['Custo Total por kg (R$/kg)']
+    edited_df['Margem de Lucro (%)'] = edited_df.apply(lambda row: (row['Lucro Líquido por kg (R$/kg)'] / row['MÉDIA/KG'] * 100) if row['MÉDIA/KG'] != 0 else 0.0, axis=1)
+    edited_df['Valor Total da Venda (R$)'] = edited_df['PREÇO DE VENDA'] * edited_df['Peso Total (kg)']
+    edited_df['Lucro Bruto Total (R$)'] = edited_df['Lucro Bruto por kg (R$/kg)'] * edited_df['Peso Total (kg)']
+    edited_df['Lucro Líquido Total (R$)'] = edited_df['Lucro Líquido por kg (R$/kg)'] * edited_df['Peso Total (kg)']
+    edited_df['Margem Líquida Inicial (%)'] = edited_df.apply(lambda row: (row['Lucro Líquido Total (R$)'] / row['Valor Total da Venda (R$)'] * 100) if row['Valor Total da Venda (R$)'] != 0 else 0.0, axis=1)
+    edited_df['Volume Total Ocupado (m³)'] = edited_df['QUANTIDADE MÍNIMA (Embalagens)'] * edited_df['Volume/m³']
+
+    margem_data = []
+    for _, row in edited_df.iterrows():
+        item = {'Fornecedor (Marca)': f"{row['FORNECEDOR']} ({row['MARCA']})"}
+        for table_column, source_column in MARGIN_TABLE_COLUMNS.items():
+            digits = 0 if table_column == 'Quantidade Mínima (Embalagens)' else 2
+            item[table_column] = round(row[source_column], digits) if pd.notna(row[source_column]) else None
+        margem_data.append(item)
+    return edited_df, pd.DataFrame(margem_data)
+
+
+# Mesmos números da versão anterior, inclusive nos casos de divisão por zero (peso total,
+# preço de compra e valor da venda zerados) e com entradas vazias (NaN, tratadas como zero)
+def test_compute_margins_matches_legacy():
+    df = make_edited_frame(3_000)
+    df.loc[0:99, ['KG da Unidade', 'UNIDADE/EMBALAGEM']] = [0.0, '1,00']
+    df.loc[100:199, 'MÉDIA/KG'] = 0.0
+    df.loc[200:299, 'PREÇO DE VENDA'] = 0.0
+    df.loc[300:399, 'QUANTIDADE MÍNIMA (Embalagens)'] = 0
+    rng = np.random.default_rng(1)
+    for col in ['PREÇO DE VENDA', 'MÉDIA/KG', 'KG da Unidade', 'QUANTIDADE MÍNIMA (Embalagens)', 'Logística (R$)', 'Volume/m³']:
+        df.loc[rng.random(len(df)) < 0.05, col] = np.nan
+    legacy_df, legacy_table = legacy_compute_margins(df)
+    new_df, new_table = compute_margins(df)
+    pd.testing.assert_frame_equal(legacy_df, new_df, check_dtype=False)
+    # round() do Python e Series.round podem divergir em empates binários na última casa
+    pd.testing.assert_frame_equal(legacy_table, new_table, check_dtype=False, rtol=0, atol=0.011)
+    assert (new_df.loc[0:99, 'Custo Total por kg (R$/kg)'] == 0).all()
+    assert (new_df.loc[100:199, 'Margem de Lucro (%)'] == 0).all()
+    assert (new_df.loc[200:299, 'Margem Líquida Inicial (%)'] == 0).all()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('12,00 unidades de 0,5 kg', (12, 0.5)),
+    ('12,00 UNIDADES DE 0,25kg', (12, 0.25)),
+    ('12 x 0,5kg', (12, 0.5)),
+    ('12 × 0,5 kg', (12, 0.5)),
+    ('caixa 24un 1kg', (24, 1.0)),
+    ('fardo 6 und. de 2,5 kg', (6, 2.5)),
+    ('12,00 unid de 0,5kg', (12, 0.5)),
+    ('12,00 und de 0,5 kg', (12, 0.5)),
+    ('2,50 un 3kg', (2, 3.0)),
+    ('3,00 unidades de 1.000,5 kg', (3, 1000.5)),
+    ('5,00', (5, 0.0)),
+    ('sem padrão', (1, 0.0)),
+])
+def test_parse_unidade_embalagem(text, expected):
+    parsed = parse_unidade_embalagem(pd.Series([text]))
+    assert (parsed['Unidades por Embalagem'][0], parsed['Peso por Unidade (kg)'][0]) == expected
+
+
+def test_parse_unidade_embalagem_missing():
+    parsed = parse_unidade_embalagem(pd.Series(['5,00', None], index=[10, 20]))
+    assert parsed.index.tolist() == [10, 20]
+    assert parsed.loc[20].tolist() == [1, 0.0]
+
+
+def test_parse_decimal():
+    parsed = parse_decimal(pd.Series(['1.000,5', '0,5', '2.5', '7', 'abc']))
+    assert parsed[:4].tolist() == [1000.5, 0.5, 2.5, 7.0]
+    assert pd.isna(parsed[4])
+
+
+# O cache é limpo por uma sessão enquanto outras o consultam
+def test_parse_cache_shared_between_threads(monkeypatch):
+    monkeypatch.setattr(margins, '_PARSE_CACHE_MAX', 50)
+    errors = []
+
+    def parse(offset):
+        try:
+            for i in range(30):
+                series = pd.Series([f'{offset + i * 40 + j},00 unidades de 1 kg' for j in range(40)])
+                parsed = parse_unidade_embalagem(series)
+                assert parsed['Unidades por Embalagem'].tolist() == [offset + i * 40 + j for j in range(40)]
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=parse, args=(k * 10_000,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+# Margens de uma sessão sobre o resultado compartilhado: mesmas linhas e valores do cálculo
+# completo do conjunto editado, com só as linhas de entradas novas recalculadas
+def test_margin_patch_matches_full_compute():
+    df = make_edited_frame(2_000)
+    base_derived, base_table = compute_margins(df)
+    overlay = new_overlay('v1', {'Impostos (R$)': (np.array([5, 7]), np.array([12.0, np.nan]))})
+    record_edits(overlay, base_derived.index, {3: {'PREÇO DE VENDA': 99.0}, 10: {'Logística (R$)': 150.0, 'QUANTIDADE MÍNIMA (Embalagens)': None}})
+    state = {}
+    patch = update_margin_patch(state, base_derived, overlay)
+    assert state['rows_recomputed'] == 4
+
+    edited = df.copy()
+    edited.loc[3, 'PREÇO DE VENDA'] = 99.0
+    edited.loc[10, ['Logística (R$)', 'QUANTIDADE MÍNIMA (Embalagens)']] = [150.0, np.nan]
+    edited.loc[[5, 7], 'Impostos (R$)'] = [12.0, np.nan]
+    expected_derived, expected_table = compute_margins(edited)
+    derived, table = combine_margins(base_derived, base_table, patch)
+    pd.testing.assert_frame_equal(derived, expected_derived)
+    pd.testing.assert_frame_equal(table, expected_table)
+
+    # Só as linhas de um filtro
+    positions = np.arange(0, 2_000, 3)
+    derived, table = combine_margins(base_derived, base_table, patch, positions)
+    pd.testing.assert_frame_equal(derived, expected_derived.iloc[positions])
+    pd.testing.assert_frame_equal(table, expected_table.iloc[positions].reset_index(drop=True))
+
+    # Nada muda: nenhuma linha recalculada; nova edição: só essa linha
+    assert update_margin_patch(state, base_derived, overlay) is patch
+    assert state['rows_recomputed'] == 0
+    record_edits(overlay, base_derived.index, {3: {'PREÇO DE VENDA': 50.0}})
+    patch = update_margin_patch(state, base_derived, overlay)
+    assert state['rows_recomputed'] == 1
+    assert sorted(patch.index.tolist()) == [3, 5, 7, 10]
+    edited.loc[3, 'PREÇO DE VENDA'] = 50.0
+    pd.testing.assert_frame_equal(combine_margins(base_derived, base_table, patch)[0], compute_margins(edited)[0])
+    # Camada nova (versão nova dos dados): todas as linhas com entradas são recalculadas
+    update_margin_patch(state, base_derived, new_overlay('v2', {'Impostos (R$)': (np.array([5]), np.array([1.0]))}))
+    assert state['rows_recomputed'] == 1
+
+
+def test_combine_without_entries_copies_nothing():
+    base_derived, base_table = compute_margins(make_edited_frame(500))
+    patch = update_margin_patch({}, base_derived, new_overlay('v1'))
+    derived, table = combine_margins(base_derived, base_table, patch)
+    assert derived is base_derived and table is base_table
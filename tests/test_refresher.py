@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from filters import build_filter_index
+from loader import ConnectionPool, SourceRefresher
+from synthetic import make_fornecedor2_csv, serve, sheet_export_path
+
+
+# Espera a condição valer (ou o prazo acabar) enquanto `readers` threads leem o conjunto atual;
+# devolve a maior espera de uma leitura em segundos
+def max_wait_until(refresher, condition, timeout=10, readers=4):
+    waits, stop = [], threading.Event()
+
+    def read():
+        worst = 0.0
+        while not stop.is_set():
+            start = time.perf_counter()
+            dataset = refresher.current()
+            worst = max(worst, time.perf_counter() - start)
+            assert dataset['prepared']['rows'] == len(dataset['df'])  # Índice sempre da mesma versão
+            time.sleep(0.001)
+        waits.append(worst)
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert condition(), "a atualização não terminou no prazo"
+    return max(waits)
+
+
+@pytest.fixture
+def sheet():
+    path = sheet_export_path()
+    payloads, delays = {path: make_fornecedor2_csv(300)}, {}
+    with serve(payloads, delays=delays) as base_url:
+        yield path, payloads, delays, base_url + sheet_export_path('{spreadsheet_id}', '{gid}')
+
+
+def make_refresher(url_template, snapshot_dir, **kwargs):
+    return SourceRefresher(
+        url_template=url_template, snapshot_dir=snapshot_dir, pool=ConnectionPool(), prepare=build_filter_index, **kwargs
+    )
+
+
+# Planilha nova servida devagar, depois falha e depois volta igual: as leituras nunca esperam pela
+# rede, a versão nova entra inteira, a falha mantém a última versão boa e a volta com o mesmo
+# conteúdo só avança a hora da confirmação
+def test_readers_never_block(sheet, tmp_path):
+    path, payloads, delays, url_template = sheet
+    refresher = make_refresher(url_template, tmp_path, interval=3600)
+    try:
+        first = refresher.current(timeout=10)
+        assert first is not None and len(first['df']) == 300 and not first['errors']
+
+        payloads[path], delays[path] = make_fornecedor2_csv(300, seed=1), 0.5
+        refresher.trigger()
+        assert max_wait_until(refresher, lambda: refresher.dataset['version'] != first['version']) < 0.25
+        changed = refresher.current()
+        assert not changed['errors'] and changed['checked_at'] >= first['checked_at']
+
+        payloads[path] = 500
+        refresher.trigger()
+        max_wait_until(refresher, lambda: refresher.status['errors'] and not refresher.status['refreshing'])
+        assert refresher.current() is changed
+
+        payloads[path] = make_fornecedor2_csv(300, seed=1)
+        del delays[path]
+        refresher.trigger()
+        max_wait_until(refresher, lambda: not refresher.status['errors'] and refresher.dataset['checked_at'] > changed['checked_at'])
+        assert refresher.current()['version'] == changed['version']
+        assert refresher.current()['df'] is changed['df']
+    finally:
+        refresher.stop(timeout=10)
+
+
+# Primeira carga durante uma queda: o conjunto vazio é servido com o erro, sem hora de
+# confirmação (nada foi carregado, nem nas novas tentativas que também falham), e a nova
+# tentativa vem depois de retry_interval, não de interval
+def test_cold_start_outage_retries(sheet, tmp_path):
+    path, payloads, _, url_template = sheet
+    good = payloads[path]
+    payloads[path] = 500
+    refresher = make_refresher(url_template, tmp_path, interval=3600, retry_interval=0.2)
+    try:
+        first = refresher.current(timeout=10)
+        assert first['errors'] and first['df'].empty
+        assert first['checked_at'] is None and refresher.age() is None
+        attempt = refresher.status['last_attempt']
+        max_wait_until(refresher, lambda: refresher.status['last_attempt'] > attempt and not refresher.status['refreshing'], timeout=5)
+        assert refresher.age() is None
+
+        payloads[path] = good
+        max_wait_until(refresher, lambda: not refresher.dataset['errors'], timeout=5)
+        assert len(refresher.current()['df']) == 300
+        assert 0 <= refresher.age() < 5
+    finally:
+        refresher.stop(timeout=10)
+
+
+# Cada revalidação é uma execução medida, mesmo fora de um rerun do dashboard
+def test_refresh_is_profiled(sheet, tmp_path):
+    _, _, _, url_template = sheet
+    refresher = make_refresher(url_template, tmp_path)
+    assert refresher.refresh()
+    run = refresher.last_run
+    assert run['label'] == 'refresh' and run['total_ms'] > 0
+    assert {'fetch', 'parse', 'clean'} <= {record['stage'] for record in run['stages']}
@@ -0,0 +1,109 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import store
+from inputs import EDITABLE_COLUMNS, apply_overlay, new_overlay, record_edits
+from loader import apply_schema, clean_supplier_frame, read_supplier_csv
+from synthetic import make_fornecedor2_csv
+
+
+@pytest.fixture
+def sheet():
+    df = clean_supplier_frame(read_supplier_csv(io.BytesIO(make_fornecedor2_csv(500)))).assign(FONTE='FORNECEDOR2')
+    # Chaves únicas, para que cada linha tenha uma identidade independente da posição
+    return apply_schema(df.drop_duplicates(store.KEY_COLUMNS, ignore_index=True))
+
+
+# Colunas editáveis indexadas pela chave (em texto), para comparar planilhas diferentes
+def by_key(frame):
+    return frame.astype({col: str for col in store.KEY_COLUMNS}).set_index(store.KEY_COLUMNS)[EDITABLE_COLUMNS]
+
+
+# Uma edição por rerun, como no editor; debounce longo para que só flush() grave
+def record(armazem, sheet, n_edits=40):
+    rng = np.random.default_rng(0)
+    chaves = store.row_keys(sheet)
+    overlay = new_overlay('v1')
+    for i, pos in enumerate(rng.choice(len(sheet), n_edits, replace=False)):
+        edits = {int(pos): {'PREÇO DE VENDA': float(i + 1), 'Logística (R$)': None if i % 7 == 0 else float(i)}}
+        armazem.put(chaves, record_edits(overlay, sheet.index, edits))
+    return by_key(apply_overlay(sheet, overlay))
+
+
+def test_put_batches_into_one_transaction(sheet, tmp_path):
+    armazem = store.InputStore(tmp_path / 'entradas.sqlite', debounce=60)
+    record(armazem, sheet)
+    assert armazem.transactions == 0
+    armazem.flush()
+    assert armazem.transactions == 1
+    armazem.close()
+    assert armazem.transactions == 1
+
+
+# Pendentes (ainda não gravadas) também voltam no load()
+def test_load_sees_pending(sheet, tmp_path):
+    armazem = store.InputStore(tmp_path / 'entradas.sqlite', debounce=60)
+    expected = record(armazem, sheet)
+    merged = by_key(apply_overlay(sheet, new_overlay('v2', armazem.load(store.row_keys(sheet)))))
+    pd.testing.assert_frame_equal(merged, expected)
+    armazem.close()
+
+
+# Um lote gravado durante o load(), antes ou depois da leitura do SQLite, aparece de um jeito
+# ou de outro
+@pytest.mark.parametrize('flush_at', ['before', 'after'])
+def test_load_during_flush(sheet, tmp_path, monkeypatch, flush_at):
+    armazem = store.InputStore(tmp_path / 'entradas.sqlite', debounce=60)
+    chaves = store.row_keys(sheet)
+    armazem.put(chaves, {5: {'PREÇO DE VENDA': 123.45}})
+    read_sql_query = pd.read_sql_query
+
+    def read_and_flush(*args, **kwargs):
+        if flush_at == 'before':
+            armazem.flush()
+        stored = read_sql_query(*args, **kwargs)
+        if flush_at == 'after':
+            armazem.flush()
+        return stored
+
+    monkeypatch.setattr(store.pd, 'read_sql_query', read_and_flush)
+    loaded = armazem.load(chaves)
+    monkeypatch.undo()
+    assert armazem.transactions == 1
+    row_ids, values = loaded['PREÇO DE VENDA']
+    assert row_ids.tolist() == [5] and values.tolist() == [123.45]
+    armazem.close()
+
+
+# Cada valor volta para a mesma linha (pela chave estável) numa planilha com linhas acrescentadas,
+# removidas ou reordenadas, lida por outro InputStore (só o disco); linhas novas ficam com os
+# valores da planilha
+@pytest.mark.parametrize('variant', ['mesma', 'reordenada', 'com linhas removidas', 'com linhas acrescentadas'])
+def test_entries_follow_rows(sheet, tmp_path, variant):
+    armazem = store.InputStore(tmp_path / 'entradas.sqlite', debounce=60)
+    expected = record(armazem, sheet)
+    armazem.close()
+
+    rng = np.random.default_rng(1)
+    if variant == 'reordenada':
+        sheet = sheet.sample(frac=1, random_state=2, ignore_index=True)
+    elif variant == 'com linhas removidas':
+        keep = np.ones(len(sheet), dtype=bool)
+        keep[rng.choice(len(sheet), len(sheet) // 10, replace=False)] = False
+        sheet = sheet[keep].reset_index(drop=True)
+    elif variant == 'com linhas acrescentadas':
+        extra = sheet.sample(50, random_state=1).assign(FORNECEDOR=lambda d: d['FORNECEDOR'].astype(str) + ' (novo)')
+        sheet = pd.concat([sheet.iloc[:len(sheet) // 2], extra, sheet.iloc[len(sheet) // 2:]], ignore_index=True)
+    sheet = apply_schema(sheet)
+
+    novo = store.InputStore(tmp_path / 'entradas.sqlite')
+    got = by_key(apply_overlay(sheet, new_overlay('v2', novo.load(store.row_keys(sheet)))))
+    novo.close()
+    known = got.index.isin(expected.index)
+    pd.testing.assert_frame_equal(got[known], expected.loc[got.index[known]])
+    pd.testing.assert_frame_equal(got[~known], by_key(apply_overlay(sheet, new_overlay('v2')))[~known])
+    if variant == 'com linhas acrescentadas':
+        assert (~known).sum() == 50